@@ -0,0 +1,225 @@
+import logging
+import os
+import threading
+import time
+
+from flask import request
+
+from API.Jobs import queue
+from API.Upload.spool import SPOOL_DIR
+
+# How often the background prober refreshes, and how old its snapshot may get
+# before readiness reports it as stale.
+PROBE_INTERVAL = float(os.environ.get('PROBE_INTERVAL', 5))
+PROBE_TTL = float(os.environ.get('PROBE_TTL', PROBE_INTERVAL * 3))
+ERROR_WINDOW = int(os.environ.get('READY_ERROR_WINDOW', 60))
+
+READY_MIN_FREE_BYTES = int(os.environ.get('READY_MIN_FREE_MB', 512)) * 1024 * 1024
+READY_MAX_QUEUE_DEPTH = int(os.environ.get('READY_MAX_QUEUE_DEPTH', 1000))
+READY_MAX_ERROR_RATE = float(os.environ.get('READY_MAX_ERROR_RATE', 0.5))
+READY_MAX_SATURATION = float(os.environ.get('READY_MAX_SATURATION', 1.0))
+
+# Health polls are neither counted towards the error rate (a 503 from the
+# readiness probe would otherwise keep the worker unready) nor allowed to
+# dilute it.
+UNCOUNTED_ENDPOINTS = {'heathcontroller', 'livenesscontroller', 'readinesscontroller'}
+
+logger = logging.getLogger(__name__)
+
+
+def worker_capacity():
+    '''
+    Number of requests one gunicorn worker can serve at once in the current
+    serving mode (see gunicorn.conf.py). Under gunicorn the post_fork hook
+    replaces this estimate with the worker's actual settings.
+    '''
+    if os.environ.get('GUNICORN_WORKER_CAPACITY'):
+        return int(os.environ['GUNICORN_WORKER_CAPACITY'])
+    mode = os.environ.get('SERVE_MODE', 'sync')
+    if mode == 'threaded':
+        return int(os.environ.get('GUNICORN_THREADS', 4))
+    if mode == 'async':
+        return int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+    return 1
+
+
+class RequestTracker(object):
+    '''
+    In-flight requests and a rolling per-second count of requests and 5xx
+    responses for this worker, maintained from request hooks. Updating it
+    is a couple of integer operations under a lock.
+
+    Listeners added with subscribe() are called as
+    ``listener(tracker, busy_seconds)`` under the lock after every change,
+    where ``busy_seconds`` is the length of a busy period (at least one
+    request in flight) that has just ended, and 0 otherwise.
+    '''
+
+    def __init__(self, window=ERROR_WINDOW):
+        self.window = window
+        self.capacity = worker_capacity()
+        self.in_flight = 0
+        self._busy_since = None
+        self._buckets = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+            listener(self, 0.0)
+
+    def _notify(self, busy_seconds=0.0):
+        for listener in self._listeners:
+            listener(self, busy_seconds)
+
+    def set_capacity(self, capacity):
+        with self._lock:
+            self.capacity = capacity
+            self._notify()
+
+    def started(self):
+        with self._lock:
+            if not self.in_flight:
+                self._busy_since = time.monotonic()
+            self.in_flight += 1
+            self._notify()
+
+    def finished(self, status_code, counted=True):
+        second = int(time.time())
+        with self._lock:
+            self.in_flight -= 1
+            busy_seconds = 0.0
+            if not self.in_flight and self._busy_since is not None:
+                busy_seconds = time.monotonic() - self._busy_since
+                self._busy_since = None
+            self._notify(busy_seconds)
+            if not counted:
+                return
+            bucket = self._buckets.get(second)
+            if bucket is None:
+                bucket = self._buckets[second] = [0, 0]
+                for old in [key for key in self._buckets if key <= second - self.window]:
+                    del self._buckets[old]
+            bucket[0] += 1
+            bucket[1] += status_code >= 500
+
+    def error_rate(self):
+        since = int(time.time()) - self.window
+        with self._lock:
+            buckets = [bucket for key, bucket in self._buckets.items() if key > since]
+        total = sum(bucket[0] for bucket in buckets)
+        return (sum(bucket[1] for bucket in buckets) / total) if total else 0.0
+
+
+class Prober(object):
+    '''
+    Runs the checks that need I/O (disk space, queue depth) on a background
+    thread and keeps the last result, so a health poll only reads memory.
+    The thread is started by the first request in each process, after any
+    fork (and after gevent has patched threading), and probes straight away;
+    until its first result arrives the snapshot is None.
+    '''
+
+    def __init__(self, interval=PROBE_INTERVAL):
+        self.interval = interval
+        self.snapshot = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self.snapshot = None
+                thread = threading.Thread(target=self._run, name='health-prober')
+                thread.daemon = True
+                thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            self.snapshot = self.probe()
+            time.sleep(self.interval)
+
+    def probe(self):
+        snapshot = {'checked_at': time.time(), 'errors': []}
+        try:
+            stat = os.statvfs(SPOOL_DIR if os.path.isdir(SPOOL_DIR)
+                              else os.path.dirname(SPOOL_DIR))
+            snapshot['disk_free_bytes'] = stat.f_bavail * stat.f_frsize
+        except OSError as e:
+            snapshot['errors'].append('disk: {}'.format(e))
+        try:
+            snapshot['queue_depth'] = queue.depth()
+        except Exception as e:
+            snapshot['errors'].append('queue: {}'.format(e))
+        if snapshot['errors']:
+            logger.warning('Health probe failed', extra={'errors': snapshot['errors']})
+        return snapshot
+
+
+tracker = RequestTracker()
+prober = Prober()
+
+
+def readiness():
+    '''
+    Combine the cached probe snapshot with the live request counters.
+    Returns ``(ready, report)`` without doing any I/O. Until the prober's
+    first result is in, disk and queue are reported as pending and do not
+    fail readiness.
+    '''
+    prober.ensure_started()
+    snapshot = prober.snapshot
+    # The readiness request itself is in flight; do not count it.
+    saturation = max(tracker.in_flight - 1, 0) / float(tracker.capacity)
+    report = {'worker_saturation': round(saturation, 3),
+              'error_rate': round(tracker.error_rate(), 3)}
+    checks = {'saturation': saturation < READY_MAX_SATURATION,
+              'error_rate': report['error_rate'] <= READY_MAX_ERROR_RATE}
+
+    if snapshot is None:
+        report['probes'] = 'pending'
+        report['checks'] = checks
+        return all(checks.values()), report
+
+    age = time.time() - snapshot['checked_at']
+    report.update(probe_age_seconds=round(age, 3),
+                  disk_free_bytes=snapshot.get('disk_free_bytes'),
+                  queue_depth=snapshot.get('queue_depth'))
+    checks['probes'] = age <= PROBE_TTL and not snapshot['errors']
+    checks['disk'] = snapshot.get('disk_free_bytes', 0) >= READY_MIN_FREE_BYTES
+    checks['queue'] = snapshot.get('queue_depth', 0) <= READY_MAX_QUEUE_DEPTH
+    if snapshot['errors']:
+        report['probe_errors'] = snapshot['errors']
+
+    report['checks'] = checks
+    return all(checks.values()), report
+
+
+def init_app(app):
+    '''
+    Register the request hooks that feed the tracker and start the prober.
+    '''
+    @app.before_request
+    def _track_start():
+        prober.ensure_started()
+        request.environ['fileupload.tracked'] = True
+        tracker.started()
+
+    @app.after_request
+    def _track_finish(response):
+        request.environ.pop('fileupload.tracked', None)
+        tracker.finished(response.status_code,
+                         request.endpoint not in UNCOUNTED_ENDPOINTS)
+        return response
+
+    @app.teardown_request
+    def _track_teardown(exc):
+        # after_request does not run when an unhandled error propagates out
+        # of the app (PROPAGATE_EXCEPTIONS, i.e. debug and testing) or an
+        # earlier after_request hook raises.
+        if request.environ.pop('fileupload.tracked', None):
+            tracker.finished(500)
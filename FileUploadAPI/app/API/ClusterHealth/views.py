@@ -1,12 +1,9 @@
 try:
-    from flask import Flask
-    from flask_restful import Resource, Api
-    from apispec import APISpec
-    from marshmallow import Schema, fields
-    from apispec.ext.marshmallow import MarshmallowPlugin
-    from flask_apispec.extension import FlaskApiSpec
+    from flask_restful import Resource
     from flask_apispec.views import MethodResource
-    from flask_apispec import marshal_with, doc, use_kwargs
+    from flask_apispec import doc
+
+    from API.ClusterHealth.probes import readiness
 
     print("All imports are ok............")
 except Exception as e:
@@ -21,6 +18,35 @@ class HeathController(MethodResource, Resource):
         '''
         Get method represents a GET API method
         '''
-        _ = {'message': 'APi are working fine'}
-        print(str(_))
-        return _
\ No newline at end of file
+        return {'message': 'APi are working fine'}
+
+
+class LivenessController(MethodResource, Resource):
+
+    @doc(description='Liveness probe. Answers as long as the worker can serve '
+                     'requests at all; it never touches disk or the queue.',
+         tags=['Health Endpoint'])
+    def get(self):
+
+        '''
+        Get method reports that the process is alive
+        '''
+        return {'status': 'alive'}
+
+
+class ReadinessController(MethodResource, Resource):
+
+    @doc(description='Readiness probe. Reports spool disk space, job queue '
+                     'depth, worker saturation and the recent 5xx rate, and '
+                     'returns 503 when any of them is out of bounds. Disk and '
+                     'queue figures come from a background probe, so a poll '
+                     'does no I/O.',
+         tags=['Health Endpoint'])
+    def get(self):
+
+        '''
+        Get method reports whether this worker should receive traffic
+        '''
+        ready, report = readiness()
+        report['status'] = 'ready' if ready else 'not ready'
+        return report, 200 if ready else 503
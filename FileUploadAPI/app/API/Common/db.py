@@ -0,0 +1,44 @@
+import os
+import sqlite3
+import sys
+import threading
+
+
+def _thread_local():
+    '''
+    Under the gevent worker threading.local is greenlet-local, which would
+    open a connection per request. SQLite calls never yield to the hub, so
+    greenlets in one OS thread can safely share a connection; use the
+    unpatched class. gevent is only consulted if something already loaded
+    it, so sync and threaded workers never pay for importing it.
+    '''
+    monkey = sys.modules.get('gevent.monkey')
+    if monkey is not None and monkey.is_module_patched('threading'):
+        return monkey.get_original('threading', 'local')()
+    return threading.local()
+
+
+class LocalConnection(object):
+    '''
+    Lazily opened SQLite connection, one per thread and per process.
+    Connections must not cross a fork, so each gunicorn worker opens its
+    own on first use.
+    '''
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self._local = _thread_local()
+
+    def __call__(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Autocommit mode; callers that need a transaction issue
+            # BEGIN IMMEDIATE themselves.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.schema)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
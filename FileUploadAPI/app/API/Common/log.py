@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message'}
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    One JSON object per line. Anything passed through ``extra=`` becomes a
+    top-level field.
+    '''
+
+    def format(self, record):
+        entry = {'ts': round(record.created, 3),
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'pid': record.process,
+                 'message': record.getMessage()}
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BackgroundHandler(QueueHandler):
+    '''
+    Hand records to a listener thread that does the actual write, so the
+    logging call on a request path never blocks on stdout. The listener is
+    started lazily in each process, which keeps this safe to configure in a
+    preloaded gunicorn master before the workers fork.
+    '''
+
+    def __init__(self, target):
+        # Records are formatted by this handler before they are queued, so
+        # the target only writes out a finished line.
+        super(BackgroundHandler, self).__init__(queue.Queue(-1))
+        self.target = target
+        self._listener = None
+        self._pid = None
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self.queue = queue.Queue(-1)
+            self._listener = QueueListener(self.queue, self.target)
+            self._listener.start()
+            self._pid = os.getpid()
+        super(BackgroundHandler, self).emit(record)
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+        super(BackgroundHandler, self).close()
+
+
+def configure_logging(level=LOG_LEVEL):
+    handler = BackgroundHandler(logging.StreamHandler(sys.stdout))
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level)
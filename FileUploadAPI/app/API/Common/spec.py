@@ -0,0 +1,70 @@
+import gzip
+import hashlib
+import io
+import json
+
+from flask import Response, request
+from flask_apispec.extension import FlaskApiSpec
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _gzip(body):
+    '''
+    gzip.compress() stamps the current time into the header; with mtime=0
+    every worker builds identical bytes for the same ETag.
+    '''
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=9, mtime=0) as fileobj:
+        fileobj.write(body)
+    return buf.getvalue()
+
+
+class CachedFlaskApiSpec(FlaskApiSpec):
+    '''
+    FlaskApiSpec that serializes the spec once instead of on every request
+    to the swagger JSON URL, and serves it precompressed with an ETag.
+    The cache is dropped whenever another resource is registered.
+    '''
+
+    _encoded = None
+
+    def register(self, *args, **kwargs):
+        super(CachedFlaskApiSpec, self).register(*args, **kwargs)
+        self._encoded = None
+
+    def encoded(self):
+        '''
+        Return ``(etag, {content_encoding: body})`` for the current spec,
+        building it on first use. Call it once after registering resources
+        so a preloaded gunicorn master does the work before forking.
+        '''
+        if self._encoded is None:
+            body = json.dumps(self.spec.to_dict(), sort_keys=True,
+                              separators=(',', ':')).encode('utf-8')
+            bodies = {'identity': body, 'gzip': _gzip(body)}
+            if brotli is not None:
+                bodies['br'] = brotli.compress(body)
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            self._encoded = (etag, bodies)
+        return self._encoded
+
+    def swagger_json(self):
+        etag, bodies = self.encoded()
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in bodies and request.accept_encodings.quality(candidate):
+                encoding = candidate
+                break
+
+        response = Response(bodies[encoding], mimetype='application/json')
+        response.set_etag(etag if encoding == 'identity'
+                          else '{}-{}'.format(etag, encoding))
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response.make_conditional(request)
@@ -0,0 +1,99 @@
+import mimetypes
+import os
+
+from flask import Response, request
+from werkzeug.http import http_date
+
+from API.Upload.spool import CHUNK_SIZE
+
+
+def _read_range(fileobj, length, chunk_size=CHUNK_SIZE):
+    '''
+    Fallback body for servers without wsgi.file_wrapper: yield at most
+    ``length`` bytes from the current position of ``fileobj``.
+    '''
+    try:
+        while length > 0:
+            chunk = fileobj.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def _sendfile_from_offset(environ):
+    '''
+    gunicorn 20.1 hands the file to socket.sendfile() without an offset, so
+    it always sends from byte 0 whatever the file position. 20.0 and 21+
+    start from the current position, which ranges rely on.
+    '''
+    return not environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/20.1.')
+
+
+def _requested_range(size, etag):
+    '''
+    Return ``(start, stop)`` for a satisfiable single byte range, None when
+    the whole file should be sent, or False when the range is unsatisfiable.
+    Multiple ranges are answered with the whole file, which RFC 7233 allows.
+    '''
+    byte_range = request.range
+    if byte_range is None or byte_range.units != 'bytes' or len(byte_range.ranges) != 1:
+        return None
+    # A range is only valid against the representation the client already
+    # has; a date-based If-Range is not trusted and gets the whole file.
+    if_range = request.if_range
+    if (if_range.etag or if_range.date) and if_range.etag != etag:
+        return None
+    return byte_range.range_for_length(size) or False
+
+
+def file_response(path, etag, filename=None, last_modified=None):
+    '''
+    Build a response for a stored file honouring If-None-Match and a single
+    Range. The body is handed to the server as wsgi.file_wrapper positioned
+    at the range start, with Content-Length set to the range length, which
+    gunicorn turns into a sendfile() of exactly those bytes.
+    '''
+    size = os.path.getsize(path)
+    headers = {'ETag': '"{}"'.format(etag),
+               'Accept-Ranges': 'bytes',
+               'Cache-Control': 'private, max-age=31536000, immutable'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    if filename:
+        headers['Content-Disposition'] = 'inline; filename="{}"'.format(
+            filename.replace('"', ''))
+    mimetype = (mimetypes.guess_type(filename)[0] if filename else None) \
+        or 'application/octet-stream'
+
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+
+    byte_range = _requested_range(size, etag)
+    if byte_range is False:
+        headers['Content-Range'] = 'bytes */{}'.format(size)
+        return Response(status=416, headers=headers)
+    if byte_range is None:
+        start, stop, status = 0, size, 200
+    else:
+        (start, stop), status = byte_range, 206
+        headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, stop - 1, size)
+
+    if request.method == 'HEAD':
+        body = None
+    else:
+        fileobj = open(path, 'rb')
+        fileobj.seek(start)
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and (not start or
+                                         _sendfile_from_offset(request.environ)):
+            body = file_wrapper(fileobj, CHUNK_SIZE)
+        else:
+            body = _read_range(fileobj, stop - start)
+
+    response = Response(body, status=status, headers=headers, mimetype=mimetype,
+                        direct_passthrough=True)
+    response.headers['Content-Length'] = str(stop - start)
+    return response
@@ -0,0 +1,30 @@
+try:
+    from flask_restful import Resource, abort
+    from flask_apispec.views import MethodResource
+    from flask_apispec import doc
+
+    from API.Documents.serve import file_response
+    from API.Upload import store
+
+except Exception as e:
+    print("Error: {} ".format(e))
+
+
+class DocumentController(MethodResource, Resource):
+
+    @doc(description='Download a stored document. Supports a single byte '
+                     'Range (206), If-Range and If-None-Match (304); the ETag '
+                     'is the SHA-256 of the content. The body is sent with '
+                     'sendfile, so it never passes through Python buffers.',
+         tags=['Documents Endpoint'])
+    def get(self, document_id):
+
+        '''
+        Get method streams a stored document or a byte range of it
+        '''
+        record = store.get(document_id)
+        if record is None:
+            abort(404, message='Unknown document')
+        return file_response(store.object_path(record['sha256']), record['sha256'],
+                             filename=record['filename'],
+                             last_modified=record['created'])
@@ -0,0 +1,70 @@
+import importlib
+import mmap
+import os
+import re
+import time
+
+# Processing entry point, as "package.module:function". The function is
+# called with the document record and the path of its stored body and
+# returns a JSON-serialisable result. The default only extracts basic
+# metadata; point this at an OCR/extraction client to do real parsing.
+JOB_PROCESSOR = os.environ.get('JOB_PROCESSOR',
+                               'API.Jobs.processing:extract_metadata')
+
+_MAGIC = (
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'GIF8', 'image/gif'),
+    (b'RIFF', 'image/webp'),
+)
+_PDF_PAGE = re.compile(rb'/Type\s*/Page(?![A-Za-z])')
+
+
+def sniff_mime_type(path):
+    with open(path, 'rb') as fileobj:
+        head = fileobj.read(16)
+    for magic, mime_type in _MAGIC:
+        if head.startswith(magic):
+            return mime_type
+    return 'application/octet-stream'
+
+
+def count_pdf_pages(path):
+    '''
+    Count page objects by scanning the file through mmap, so even a large
+    PDF is never read into Python memory.
+    '''
+    with open(path, 'rb') as fileobj:
+        if not os.fstat(fileobj.fileno()).st_size:
+            return 0
+        with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return sum(1 for _ in _PDF_PAGE.finditer(data))
+
+
+def extract_metadata(document, path):
+    mime_type = sniff_mime_type(path)
+    result = {'mime_type': mime_type,
+              'size': document['size'],
+              'sha256': document['sha256'],
+              'filename': document['filename']}
+    if mime_type == 'application/pdf':
+        result['pages'] = count_pdf_pages(path)
+    elif mime_type.startswith('image/'):
+        result['pages'] = 1
+    return result
+
+
+def load_processor(spec=JOB_PROCESSOR):
+    module_name, _, func_name = spec.partition(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run(processor, document, path):
+    started = time.time()
+    result = processor(document, path)
+    return {'document_id': document['document_id'],
+            'processing_seconds': round(time.time() - started, 3),
+            'prediction': result}
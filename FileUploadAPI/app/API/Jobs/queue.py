@@ -0,0 +1,162 @@
+import json
+import os
+import socket
+import time
+import uuid
+
+from API.Common.db import LocalConnection
+from API.Upload.spool import SPOOL_DIR
+
+# Document-processing jobs, kept in a local SQLite file so the web workers
+# and the worker pool (worker.py) share a queue without an external broker.
+QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', os.path.join(SPOOL_DIR, 'jobs.sqlite3'))
+# A running job whose worker has not finished it within this many seconds is
+# assumed lost (worker hung or killed, container restarted) and is queued
+# again. worker.py kills its own workers that overrun it.
+JOB_TIMEOUT = float(os.environ.get('JOB_TIMEOUT', 300))
+MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id      TEXT PRIMARY KEY,
+    document_id TEXT NOT NULL UNIQUE,
+    status      TEXT NOT NULL,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    result      TEXT,
+    error       TEXT,
+    created     REAL NOT NULL,
+    started     REAL,
+    finished    REAL,
+    claim       TEXT,
+    worker      TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+'''
+_COLUMNS = ('job_id', 'document_id', 'status', 'attempts', 'result', 'error',
+            'created', 'started', 'finished')
+
+connection = LocalConnection(QUEUE_PATH, _SCHEMA)
+
+
+def _record(row):
+    if not row:
+        return None
+    job = dict(zip(_COLUMNS, row))
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def _select(where, params):
+    return _record(connection().execute(
+        'SELECT {} FROM jobs WHERE {}'.format(', '.join(_COLUMNS), where),
+        params).fetchone())
+
+
+def get(job_id):
+    return _select('job_id = ?', (job_id,))
+
+
+def find_by_document(document_id):
+    return _select('document_id = ?', (document_id,))
+
+
+def worker_id(pid=None):
+    '''
+    Identifies a worker process across the hosts sharing the queue.
+    '''
+    return '{}:{}'.format(socket.gethostname(), pid or os.getpid())
+
+
+def enqueue(document_id):
+    '''
+    Queue processing for a document. A document is only ever processed
+    once, so enqueueing it again returns the job that already exists.
+    '''
+    connection().execute(
+        'INSERT OR IGNORE INTO jobs (job_id, document_id, status, created) '
+        'VALUES (?, ?, ?, ?)',
+        (uuid.uuid4().hex, document_id, QUEUED, time.time()))
+    return find_by_document(document_id)
+
+
+def claim():
+    '''
+    Atomically move the oldest queued job to running and return it, or
+    return None when the queue is empty. The returned job carries a
+    ``claim`` token that finish() and fail() must present.
+    '''
+    conn = connection()
+    claim_token = uuid.uuid4().hex
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            'SELECT job_id FROM jobs WHERE status = ? ORDER BY created LIMIT 1',
+            (QUEUED,)).fetchone()
+        if row is not None:
+            conn.execute(
+                'UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1, '
+                'claim = ?, worker = ? WHERE job_id = ?',
+                (RUNNING, time.time(), claim_token, worker_id(), row[0]))
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return dict(get(row[0]), claim=claim_token) if row is not None else None
+
+
+# Once a job has been requeued its old claim is void, so a worker that
+# overran JOB_TIMEOUT cannot overwrite the outcome of the retry.
+_RETRY_OR_FAIL = ('status = CASE WHEN attempts < {} THEN ? ELSE ? END, '
+                  'claim = NULL'.format(MAX_ATTEMPTS))
+
+
+def finish(job_id, claim, result):
+    '''
+    Record the result of a job. Returns False, recording nothing, if the
+    claim is no longer current.
+    '''
+    return bool(connection().execute(
+        'UPDATE jobs SET status = ?, result = ?, error = NULL, finished = ?, '
+        'claim = NULL WHERE job_id = ? AND claim = ?',
+        (DONE, json.dumps(result), time.time(), job_id, claim)).rowcount)
+
+
+def fail(job_id, claim, error):
+    '''
+    Record a failed attempt. The job goes back on the queue until it has
+    used up MAX_ATTEMPTS. Returns False, recording nothing, if the claim is
+    no longer current.
+    '''
+    return bool(connection().execute(
+        'UPDATE jobs SET {}, error = ?, finished = ? '
+        'WHERE job_id = ? AND claim = ?'.format(_RETRY_OR_FAIL),
+        (QUEUED, FAILED, error, time.time(), job_id, claim)).rowcount)
+
+
+def release(worker, error):
+    '''
+    Requeue (or fail) the running jobs of a worker that has died or been
+    killed. Returns the number of jobs released.
+    '''
+    return connection().execute(
+        'UPDATE jobs SET {}, error = ?, finished = ? '
+        'WHERE status = ? AND worker = ?'.format(_RETRY_OR_FAIL),
+        (QUEUED, FAILED, error, time.time(), RUNNING, worker)).rowcount
+
+
+def requeue_stale(timeout=JOB_TIMEOUT):
+    '''
+    Requeue (or fail) jobs that have been running for longer than
+    ``timeout``, e.g. because the host running them went away.
+    '''
+    return connection().execute(
+        "UPDATE jobs SET {}, error = 'Timed out' "
+        'WHERE status = ? AND started < ?'.format(_RETRY_OR_FAIL),
+        (QUEUED, FAILED, RUNNING, time.time() - timeout)).rowcount
+
+
+def depth():
+    return connection().execute(
+        'SELECT COUNT(*) FROM jobs WHERE status = ?', (QUEUED,)).fetchone()[0]
@@ -0,0 +1,26 @@
+try:
+    from flask_restful import Resource, abort
+    from flask_apispec.views import MethodResource
+    from flask_apispec import doc
+
+    from API.Jobs import queue
+
+except Exception as e:
+    print("Error: {} ".format(e))
+
+
+class JobController(MethodResource, Resource):
+
+    @doc(description='Status of a document-processing job. status is one of '
+                     'queued, running, done or failed; result is set once the '
+                     'job is done.',
+         tags=['Jobs Endpoint'])
+    def get(self, job_id):
+
+        '''
+        Get method reports the status and result of a processing job
+        '''
+        job = queue.get(job_id)
+        if job is None:
+            abort(404, message='Unknown job')
+        return job
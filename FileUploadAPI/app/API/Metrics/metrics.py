@@ -0,0 +1,110 @@
+import os
+import time
+
+from flask import request
+from prometheus_client import (CONTENT_TYPE_LATEST,
+                               REGISTRY,
+                               CollectorRegistry,
+                               Counter,
+                               Gauge,
+                               Histogram,
+                               generate_latest)
+from prometheus_client import multiprocess
+
+from API.ClusterHealth import probes
+from API.Metrics import profiler
+
+# Under gunicorn, gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a shared
+# directory before the app is imported. Every worker then records into its own
+# mmap'd file there and /metrics, whichever worker serves it, sums them all.
+MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+if MULTIPROCESS:
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+# Endpoints whose request body is a document upload, for the throughput metric.
+UPLOAD_ENDPOINTS = {'uploadcontroller', 'multipartpartcontroller'}
+
+_SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 1024 ** 2, 8 * 1024 ** 2,
+                 64 * 1024 ** 2, 512 * 1024 ** 2, float('inf'))
+_RATE_BUCKETS = (128 * 1024, 1024 ** 2, 8 * 1024 ** 2, 32 * 1024 ** 2,
+                 128 * 1024 ** 2, 512 * 1024 ** 2, float('inf'))
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by route',
+    ['method', 'endpoint', 'status'])
+REQUEST_SIZE = Histogram(
+    'http_request_size_bytes', 'Request body size by route',
+    ['endpoint'], buckets=_SIZE_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Response body size by route, when known',
+    ['endpoint'], buckets=_SIZE_BUCKETS)
+UPLOAD_THROUGHPUT = Histogram(
+    'upload_throughput_bytes_per_second', 'Per-request upload throughput',
+    ['endpoint'], buckets=_RATE_BUCKETS)
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being served',
+    multiprocess_mode='livesum')
+WORKER_CAPACITY = Gauge(
+    'gunicorn_worker_capacity', 'Requests the live workers can serve at once',
+    multiprocess_mode='livesum')
+WORKER_BUSY = Counter(
+    'gunicorn_worker_busy_seconds', 'Time workers spent with at least one '
+    'request in flight; rate() divided by worker count gives utilization')
+
+
+def registry():
+    if not MULTIPROCESS:
+        return REGISTRY
+    collected = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collected)
+    return collected
+
+
+def exposition():
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _tracked(tracker, busy_seconds):
+    IN_FLIGHT.set(tracker.in_flight)
+    WORKER_CAPACITY.set(tracker.capacity)
+    if busy_seconds:
+        WORKER_BUSY.inc(busy_seconds)
+
+
+def init_app(app):
+    '''
+    Register the request hooks that record metrics and, when enabled, the
+    per-request sampling profiler. In-flight requests, capacity and busy
+    time come from the health probes' request tracker.
+    '''
+    probes.tracker.subscribe(_tracked)
+
+    @app.before_request
+    def _metrics_start():
+        request.environ['fileupload.started'] = time.perf_counter()
+        profiler.maybe_start()
+
+    @app.after_request
+    def _metrics_finish(response):
+        started = request.environ.pop('fileupload.started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint()
+        REQUEST_LATENCY.labels(request.method, endpoint,
+                               str(response.status_code)).observe(elapsed)
+        # Upload views record the bytes they actually read, which also covers
+        # chunked bodies that have no Content-Length.
+        received = request.environ.get('fileupload.body_bytes', request.content_length)
+        if received:
+            REQUEST_SIZE.labels(endpoint).observe(received)
+            if endpoint in UPLOAD_ENDPOINTS and elapsed > 0:
+                UPLOAD_THROUGHPUT.labels(endpoint).observe(received / elapsed)
+        if response.content_length is not None:
+            RESPONSE_SIZE.labels(endpoint).observe(response.content_length)
+        profiler.maybe_stop(response)
+        return response
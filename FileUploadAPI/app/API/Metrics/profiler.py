@@ -0,0 +1,89 @@
+import collections
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import request
+
+# Per-request sampling profiler. With PROFILING_ENABLED=1, a request carrying
+# an "X-Profile: 1" header is sampled every PROFILE_INTERVAL seconds from a
+# helper thread, and the collapsed stacks are written to PROFILE_DIR in the
+# format flamegraph.pl and speedscope read. The response names the file in
+# its X-Profile header. Requests without the header pay one dict lookup.
+#
+# Sampling relies on OS threads, so it is not available under the gevent
+# (SERVE_MODE=async) worker where every request shares one thread.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_DIR = os.environ.get('PROFILE_DIR',
+                             os.path.join(tempfile.gettempdir(), 'fileupload-profiles'))
+
+
+class Sampler(object):
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name,
+                                                 os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as fileobj:
+            for stack, count in self.stacks.most_common():
+                fileobj.write('{} {}\n'.format(stack, count))
+
+
+def _available():
+    monkey = sys.modules.get('gevent.monkey')
+    return not (monkey is not None and monkey.is_module_patched('threading'))
+
+
+def maybe_start():
+    if not PROFILING_ENABLED or request.headers.get('X-Profile') != '1':
+        return
+    if not _available():
+        request.environ['fileupload.profile'] = None
+        return
+    sampler = Sampler(threading.get_ident())
+    request.environ['fileupload.profile'] = sampler
+    sampler.start()
+
+
+def maybe_stop(response):
+    if 'fileupload.profile' not in request.environ:
+        return
+    sampler = request.environ.pop('fileupload.profile')
+    if sampler is None:
+        response.headers['X-Profile'] = 'unavailable'
+        return
+    sampler.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, '{}-{}-{}.folded'.format(
+        int(time.time() * 1000), os.getpid(), request.endpoint or 'unmatched'))
+    sampler.write(path)
+    response.headers['X-Profile'] = path
+    response.headers['X-Profile-Samples'] = str(sum(sampler.stacks.values()))
@@ -0,0 +1,26 @@
+try:
+    from flask import Response
+    from flask_restful import Resource
+    from flask_apispec.views import MethodResource
+    from flask_apispec import doc
+
+    from API.Metrics.metrics import exposition
+
+except Exception as e:
+    print("Error: {} ".format(e))
+
+
+class MetricsController(MethodResource, Resource):
+
+    @doc(description='Prometheus metrics aggregated across all gunicorn '
+                     'workers: per-route latency, request and response sizes, '
+                     'upload throughput, in-flight requests and worker '
+                     'utilization.',
+         tags=['Metrics Endpoint'])
+    def get(self):
+
+        '''
+        Get method returns metrics in the Prometheus text format
+        '''
+        body, content_type = exposition()
+        return Response(body, content_type=content_type)
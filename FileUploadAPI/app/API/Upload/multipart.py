@@ -0,0 +1,402 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+
+from API.Upload import store
+from API.Upload.spool import (INCOMING_DIR,
+                              MAX_UPLOAD_BYTES,
+                              SPOOL_DIR,
+                              UPLOAD_TTL,
+                              EmptyUpload,
+                              UploadTooLarge,
+                              append_file,
+                              copy_stream,
+                              discard,
+                              ensure_dirs,
+                              hash_file)
+
+MULTIPART_DIR = os.path.join(SPOOL_DIR, 'multipart')
+MAX_PARTS = int(os.environ.get('UPLOAD_MAX_PARTS', 10000))
+# A completion lock older than this is treated as abandoned even when its
+# owner cannot be checked (it was taken on another host or container).
+COMPLETE_TIMEOUT = float(os.environ.get('UPLOAD_COMPLETE_TIMEOUT', 3600))
+
+# Multi-part uploads live entirely on disk so that any gunicorn worker can
+# serve any request for them:
+#
+#   multipart/<upload_id>/upload.json        upload metadata
+#   multipart/<upload_id>/00001.<token>.part part body, one per attempt
+#   multipart/<upload_id>/00001.json         part size, sha256 and body file
+#   multipart/<upload_id>/.completing        lock held while assembling
+#
+# Part data and metadata are always written to a temporary file and renamed
+# into place, so a reader only ever sees whole parts. Each attempt at a part
+# keeps its body under its own name and only the rename of the part's json
+# publishes it, so concurrent retries of one part can never pair one
+# attempt's body with another's size and checksum. The lock records the
+# pid, host and start time of its owner, so one left behind by a worker that
+# was killed mid-assembly does not block the upload forever.
+
+_UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class InvalidPart(Exception):
+    pass
+
+
+class UploadBusy(Exception):
+    pass
+
+
+def upload_dir(upload_id):
+    if not _UPLOAD_ID.match(upload_id):
+        raise UploadNotFound(upload_id)
+    return os.path.join(MULTIPART_DIR, upload_id)
+
+
+def _existing_upload_dir(upload_id):
+    path = upload_dir(upload_id)
+    if not os.path.isfile(os.path.join(path, 'upload.json')):
+        raise UploadNotFound(upload_id)
+    return path
+
+
+def _part_name(part_number):
+    return '{:05d}'.format(part_number)
+
+
+def _write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as fileobj:
+        json.dump(data, fileobj)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path) as fileobj:
+        return json.load(fileobj)
+
+
+def _read_lock(path):
+    lock_path = os.path.join(path, '.completing')
+    try:
+        return _read_json(lock_path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        # Created but not written yet, or its owner died in between.
+        try:
+            return {'token': None, 'started': os.stat(lock_path).st_mtime}
+        except OSError:
+            return None
+
+
+def _lock_is_stale(lock):
+    if time.time() - lock['started'] > COMPLETE_TIMEOUT:
+        return True
+    if not lock.get('pid') or lock.get('host') != socket.gethostname():
+        return False
+    try:
+        os.kill(lock['pid'], 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def _completing(path):
+    lock = _read_lock(path)
+    return lock is not None and not _lock_is_stale(lock)
+
+
+def _break_lock(path, lock):
+    '''
+    Remove the stale ``lock``, unless another process has replaced it with
+    a fresh one since it was read.
+    '''
+    lock_path = os.path.join(path, '.completing')
+    moved = '{}.{}.stale'.format(lock_path, uuid.uuid4().hex)
+    try:
+        os.rename(lock_path, moved)
+    except FileNotFoundError:
+        return
+    try:
+        current = _read_json(moved)
+    except (OSError, ValueError):
+        current = {'token': None}
+    if current.get('token') != lock.get('token'):
+        try:
+            os.link(moved, lock_path)
+        except FileExistsError:
+            pass
+    discard(moved)
+
+
+def _acquire_lock(path, upload_id):
+    lock_path = os.path.join(path, '.completing')
+    for _ in range(3):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            lock = _read_lock(path)
+            if lock is not None and not _lock_is_stale(lock):
+                raise UploadBusy(upload_id)
+            if lock is not None:
+                _break_lock(path, lock)
+            continue
+        lock = {'token': uuid.uuid4().hex,
+                'pid': os.getpid(),
+                'host': socket.gethostname(),
+                'started': time.time()}
+        with os.fdopen(fd, 'w') as fileobj:
+            json.dump(lock, fileobj)
+        return lock
+    raise UploadBusy(upload_id)
+
+
+def _release_lock(path, lock):
+    current = _read_lock(path)
+    if current is not None and current.get('token') == lock['token']:
+        discard(os.path.join(path, '.completing'))
+
+
+def _received_bytes(path, exclude=None):
+    return sum(part['size'] for part in _list_parts(path)
+               if part['part_number'] != exclude)
+
+
+def initiate(filename=None):
+    ensure_dirs()
+    upload_id = uuid.uuid4().hex
+    path = upload_dir(upload_id)
+    os.makedirs(path)
+    _write_json(os.path.join(path, 'upload.json'),
+                {'upload_id': upload_id,
+                 'filename': filename,
+                 'created': time.time()})
+    return upload_id
+
+
+def put_part(upload_id, part_number, stream, expected_sha256=None):
+    '''
+    Stream one part to disk, hashing it on the way through. Re-sending a
+    part replaces the previous copy, which is what makes retries cheap.
+    '''
+    path = _existing_upload_dir(upload_id)
+    if not 1 <= part_number <= MAX_PARTS:
+        raise InvalidPart('Part number must be between 1 and {}'.format(MAX_PARTS))
+    if _completing(path):
+        raise UploadBusy(upload_id)
+    # The size limit applies to the assembled document, so a part may only
+    # use what the other parts have left of it.
+    limit = MAX_UPLOAD_BYTES
+    if limit:
+        limit -= _received_bytes(path, exclude=part_number)
+        if limit <= 0:
+            raise UploadTooLarge(upload_id)
+
+    name = _part_name(part_number)
+    hasher = hashlib.sha256()
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=path, prefix=name + '.', suffix='.tmp')
+        with os.fdopen(fd, 'wb', buffering=0) as fileobj:
+            size = copy_stream(stream, fileobj, limit=limit, hasher=hasher)
+        if not size:
+            raise EmptyUpload()
+        sha256 = hasher.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise InvalidPart('Checksum mismatch for part {}'.format(part_number))
+        # complete() may have started while this part was streaming.
+        if _completing(path):
+            raise UploadBusy(upload_id)
+        body = os.path.basename(tmp_path)[:-len('.tmp')] + '.part'
+        os.replace(tmp_path, os.path.join(path, body))
+        previous = _read_part(path, name)
+        part = {'part_number': part_number, 'size': size, 'sha256': sha256,
+                'body': body}
+        _write_json(os.path.join(path, name + '.json'), part)
+    except FileNotFoundError:
+        # The upload was aborted, completed or expired meanwhile.
+        if tmp_path:
+            discard(tmp_path)
+        raise UploadNotFound(upload_id)
+    except BaseException:
+        if tmp_path:
+            discard(tmp_path)
+        raise
+
+    # The replaced attempt's body is no longer referenced. Once complete()
+    # holds the lock it may be reading it, so it is left for the final
+    # cleanup of the upload directory instead.
+    if previous is not None and not _completing(path):
+        discard(os.path.join(path, previous['body']))
+    return _public(part)
+
+
+def _read_part(path, name):
+    try:
+        return _read_json(os.path.join(path, name + '.json'))
+    except (OSError, ValueError):
+        return None
+
+
+def _public(part):
+    return {key: value for key, value in part.items() if key != 'body'}
+
+
+def _list_parts(path):
+    parts = []
+    for entry in sorted(os.listdir(path)):
+        if entry.endswith('.json') and entry != 'upload.json':
+            try:
+                parts.append(_read_json(os.path.join(path, entry)))
+            except (OSError, ValueError):
+                # The part is being replaced or the upload was just aborted.
+                continue
+    offset = 0
+    for part in parts:
+        part['offset'] = offset
+        offset += part['size']
+    return parts
+
+
+def list_parts(upload_id):
+    return [_public(part) for part in _list_parts(_existing_upload_dir(upload_id))]
+
+
+def describe(upload_id):
+    upload = _read_json(os.path.join(_existing_upload_dir(upload_id),
+                                     'upload.json'))
+    upload['parts'] = list_parts(upload_id)
+    return upload
+
+
+def _expected_checksums(expected_parts):
+    '''
+    Validate the client's part list and return it as
+    ``{part_number: sha256 or None}``.
+    '''
+    if not isinstance(expected_parts, list):
+        raise InvalidPart('parts must be a list')
+    expected = {}
+    for part in expected_parts:
+        if not isinstance(part, dict):
+            raise InvalidPart('Each entry in parts must be an object')
+        number, sha256 = part.get('part_number'), part.get('sha256')
+        # bool is an int subclass, but true is not a part number.
+        if not isinstance(number, int) or isinstance(number, bool):
+            raise InvalidPart('part_number must be an integer')
+        if sha256 is not None and not isinstance(sha256, str):
+            raise InvalidPart('sha256 must be a string')
+        if number in expected:
+            raise InvalidPart('Part {} is listed more than once'.format(number))
+        expected[number] = sha256
+    return expected
+
+
+def complete(upload_id, body=None):
+    '''
+    Concatenate the received parts into a single document and drop the
+    upload. ``body`` is the client's optional request body; its ``parts``
+    lists the ``{'part_number': .., 'sha256': ..}`` it believes it sent.
+    '''
+    path = _existing_upload_dir(upload_id)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        raise InvalidPart('Body must be a JSON object')
+    expected_parts = body.get('parts')
+    if expected_parts is not None:
+        expected = _expected_checksums(expected_parts)
+    lock = _acquire_lock(path, upload_id)
+
+    try:
+        upload = _read_json(os.path.join(path, 'upload.json'))
+        parts = _list_parts(path)
+        if not parts:
+            raise InvalidPart('No parts have been uploaded')
+        if MAX_UPLOAD_BYTES and sum(part['size'] for part in parts) > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(upload_id)
+        numbers = [part['part_number'] for part in parts]
+        if numbers != list(range(1, len(parts) + 1)):
+            raise InvalidPart('Parts must be numbered contiguously from 1')
+        if expected_parts is not None:
+            received = {part['part_number']: part['sha256'] for part in parts}
+            if set(expected) != set(received):
+                raise InvalidPart('Part list does not match the received parts')
+            for number, sha256 in expected.items():
+                if sha256 and sha256.lower() != received[number]:
+                    raise InvalidPart('Checksum mismatch for part {}'.format(number))
+
+        fd, tmp_path = tempfile.mkstemp(dir=INCOMING_DIR)
+        try:
+            with os.fdopen(fd, 'wb', buffering=0) as fileobj:
+                size = 0
+                for part in parts:
+                    size += append_file(os.path.join(path, part['body']),
+                                        fileobj.fileno())
+            # SHA-256 cannot be combined from the per-part digests, so the
+            # assembled file is hashed once here for the content store.
+            record, duplicate = store.ingest(tmp_path, size, hash_file(tmp_path),
+                                             upload['filename'])
+        except BaseException:
+            discard(tmp_path)
+            raise
+    except BaseException:
+        _release_lock(path, lock)
+        raise
+
+    shutil.rmtree(path, ignore_errors=True)
+    return {'document_id': record['document_id'],
+            'filename': record['filename'],
+            'size': size,
+            'sha256': record['sha256'],
+            'duplicate': duplicate,
+            'parts': len(parts)}
+
+
+def abort_upload(upload_id):
+    path = _existing_upload_dir(upload_id)
+    if _completing(path):
+        raise UploadBusy(upload_id)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def expire_stale(ttl=UPLOAD_TTL):
+    '''
+    Remove uploads that have seen no activity for ``ttl`` seconds, whether
+    abandoned by the client or left behind by a failed completion. Returns
+    the number removed.
+    '''
+    try:
+        upload_ids = os.listdir(MULTIPART_DIR)
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - ttl
+    expired = 0
+    for upload_id in upload_ids:
+        path = os.path.join(MULTIPART_DIR, upload_id)
+        try:
+            # Every part write touches the directory or a file in it.
+            last_active = max([os.stat(path).st_mtime] +
+                              [os.stat(os.path.join(path, entry)).st_mtime
+                               for entry in os.listdir(path)])
+        except OSError:
+            continue
+        if last_active >= cutoff or _completing(path):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        expired += 1
+    return expired
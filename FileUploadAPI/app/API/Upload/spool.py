@@ -0,0 +1,154 @@
+import hashlib
+import os
+import tempfile
+import time
+
+# Size of each read from the request stream; this bounds per-upload memory.
+CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 64 * 1024))
+# Optional hard limit on the size of a single upload (0 disables it).
+MAX_UPLOAD_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 0))
+# Spooled files and multi-part uploads idle for longer than this many
+# seconds are assumed abandoned and removed by the worker's sweep.
+UPLOAD_TTL = float(os.environ.get('UPLOAD_TTL', 24 * 60 * 60))
+SPOOL_DIR = os.environ.get('SPOOL_DIR',
+                           os.path.join(tempfile.gettempdir(), 'fileupload-spool'))
+
+INCOMING_DIR = os.path.join(SPOOL_DIR, 'incoming')
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class EmptyUpload(Exception):
+    pass
+
+
+def ensure_dirs():
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+
+
+def discard(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def expire_stale(ttl=UPLOAD_TTL):
+    '''
+    Remove temporary files in the incoming directory that have not been
+    written to for ``ttl`` seconds, left behind by requests whose worker was
+    killed. Returns the number removed.
+    '''
+    try:
+        names = os.listdir(INCOMING_DIR)
+    except FileNotFoundError:
+        return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    for name in names:
+        path = os.path.join(INCOMING_DIR, name)
+        try:
+            if os.stat(path).st_mtime >= cutoff:
+                continue
+        except OSError:
+            continue
+        discard(path)
+        removed += 1
+    return removed
+
+
+def copy_stream(stream, fileobj, chunk_size=CHUNK_SIZE, limit=MAX_UPLOAD_BYTES,
+                hasher=None):
+    '''
+    Copy ``stream`` into ``fileobj`` one chunk at a time and return the
+    number of bytes written. Only a single chunk is held in memory. If
+    ``hasher`` is given it is updated with every chunk as it passes through.
+    '''
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return total
+        total += len(chunk)
+        if limit and total > limit:
+            raise UploadTooLarge(total)
+        if hasher is not None:
+            hasher.update(chunk)
+        fileobj.write(chunk)
+
+
+def append_file(src_path, dst_fd):
+    '''
+    Append the whole of ``src_path`` to the file open at ``dst_fd`` using
+    in-kernel copies, so the bytes never pass through Python buffers.
+    Falls back to sendfile and finally to a plain chunked copy.
+    '''
+    with open(src_path, 'rb') as src:
+        src_fd = src.fileno()
+        size = os.fstat(src_fd).st_size
+        offset = 0
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(src_fd, dst_fd, size - offset,
+                                                offset)
+                    if not copied:
+                        break
+                    offset += copied
+            except OSError:
+                pass
+        if offset < size and hasattr(os, 'sendfile'):
+            try:
+                while offset < size:
+                    sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                    if not sent:
+                        break
+                    offset += sent
+            except OSError:
+                pass
+        src.seek(offset)
+        while offset < size:
+            chunk = memoryview(src.read(min(CHUNK_SIZE, size - offset)))
+            if not chunk:
+                break
+            offset += len(chunk)
+            while chunk:
+                chunk = chunk[os.write(dst_fd, chunk):]
+    return size
+
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    '''
+    SHA-256 of a file already on disk, read into a single reused buffer.
+    '''
+    hasher = hashlib.sha256()
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as fileobj:
+        while True:
+            count = fileobj.readinto(buf)
+            if not count:
+                return hasher.hexdigest()
+            hasher.update(view[:count])
+
+
+def spool_stream(stream):
+    '''
+    Spool ``stream`` to a temporary file in the incoming directory, hashing
+    it on the way through. Returns ``(tmp_path, size, sha256)``; the caller
+    owns the temporary file from then on.
+    '''
+    ensure_dirs()
+    hasher = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=INCOMING_DIR)
+    try:
+        with os.fdopen(fd, 'wb', buffering=0) as fileobj:
+            size = copy_stream(stream, fileobj, limit=MAX_UPLOAD_BYTES, hasher=hasher)
+        if not size:
+            raise EmptyUpload()
+    except BaseException:
+        discard(tmp_path)
+        raise
+    return tmp_path, size, hasher.hexdigest()
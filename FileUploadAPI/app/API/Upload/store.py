@@ -0,0 +1,89 @@
+import os
+import time
+import uuid
+
+from API.Common.db import LocalConnection
+from API.Upload.spool import SPOOL_DIR, discard
+
+# Content-addressed document store. Each distinct body is kept exactly once
+# under objects/<aa>/<bb>/<sha256>, and index.sqlite3 maps document ids and
+# hashes to it. An upload whose hash is already indexed is dropped and the
+# existing document is returned instead.
+#
+# With UPLOAD_CHECKSUM_PRECHECK=1 a client may send the SHA-256 of its body in
+# X-Checksum-Sha256 and, if that content is already stored, get the existing
+# document back before the body is written anywhere. It is off by default:
+# it lets anyone who knows a hash (downloads use it as their ETag) obtain the
+# document id without having the content.
+CHECKSUM_PRECHECK = os.environ.get('UPLOAD_CHECKSUM_PRECHECK', '0') == '1'
+OBJECTS_DIR = os.path.join(SPOOL_DIR, 'objects')
+INDEX_PATH = os.environ.get('STORE_INDEX_PATH',
+                            os.path.join(SPOOL_DIR, 'index.sqlite3'))
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    sha256      TEXT NOT NULL UNIQUE,
+    size        INTEGER NOT NULL,
+    filename    TEXT,
+    created     REAL NOT NULL
+);
+'''
+_COLUMNS = ('document_id', 'sha256', 'size', 'filename', 'created')
+
+connection = LocalConnection(INDEX_PATH, _SCHEMA)
+
+
+def object_path(sha256):
+    return os.path.join(OBJECTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def _record(row):
+    return dict(zip(_COLUMNS, row)) if row else None
+
+
+def find_by_hash(sha256):
+    return _record(connection().execute(
+        'SELECT {} FROM documents WHERE sha256 = ?'.format(', '.join(_COLUMNS)),
+        (sha256,)).fetchone())
+
+
+def get(document_id):
+    return _record(connection().execute(
+        'SELECT {} FROM documents WHERE document_id = ?'.format(', '.join(_COLUMNS)),
+        (document_id,)).fetchone())
+
+
+def document_path(document_id):
+    record = get(document_id)
+    return object_path(record['sha256']) if record else None
+
+
+def ingest(tmp_path, size, sha256, filename=None):
+    '''
+    Move a fully received temporary file into the store. Returns
+    ``(record, duplicate)``; when ``duplicate`` is true nothing was written
+    and ``record`` is the document that already holds this content.
+    '''
+    existing = find_by_hash(sha256)
+    if existing is not None:
+        discard(tmp_path)
+        return existing, True
+
+    path = object_path(sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Two workers racing on the same content rename identical bytes onto the
+    # same path, so the object is correct whichever rename lands last.
+    os.replace(tmp_path, path)
+    document_id = uuid.uuid4().hex
+    cursor = connection().execute(
+        'INSERT OR IGNORE INTO documents ({}) VALUES (?, ?, ?, ?, ?)'.format(
+            ', '.join(_COLUMNS)),
+        (document_id, sha256, size, filename, time.time()))
+    return find_by_hash(sha256), cursor.rowcount == 0
+
+
+def stats():
+    count, total = connection().execute(
+        'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM documents').fetchone()
+    return {'documents': count, 'stored_bytes': total}
@@ -0,0 +1,174 @@
+try:
+    from flask import request
+    from flask_restful import Resource, abort
+    from flask_apispec.views import MethodResource
+    from flask_apispec import doc
+
+    from API.Upload.spool import (EmptyUpload,
+                                  UploadTooLarge,
+                                  discard,
+                                  spool_stream)
+    from API.Upload import multipart, store
+    from API.Jobs import queue
+
+except Exception as e:
+    print("Error: {} ".format(e))
+
+
+def _accepted(document):
+    '''
+    Queue processing for a stored document and build the upload response.
+    Duplicates get the job that was created for the original upload.
+    '''
+    job = queue.enqueue(document['document_id'])
+    document.pop('created', None)
+    document.update(job_id=job['job_id'], job_status=job['status'])
+    return (document, 200 if document['duplicate'] else 202,
+            {'Location': '/jobs/{}'.format(job['job_id'])})
+
+
+class UploadController(MethodResource, Resource):
+
+    @doc(description='Upload a document as the raw request body. The body is '
+                     'streamed to disk in fixed-size chunks; send it as '
+                     'application/octet-stream and pass the original name in '
+                     'the X-Filename header. Processing is queued and the '
+                     'response is 202 with a job_id to poll on /jobs/<job_id>. '
+                     'Re-uploading content that is already stored returns the '
+                     'existing document and job with 200. An optional '
+                     'X-Checksum-Sha256 header is verified and, when the '
+                     'server allows it, lets a known document be returned '
+                     'without storing the body again.',
+         tags=['Upload Endpoint'])
+    def post(self):
+
+        '''
+        Post method streams the request body into the document store
+        '''
+        # request.files / request.data would buffer the whole body in memory,
+        # so only ever read from request.stream here.
+        if request.mimetype == 'multipart/form-data':
+            abort(415, message='Send the document as the raw request body, '
+                               'not as multipart/form-data')
+
+        checksum = (request.headers.get('X-Checksum-Sha256') or '').lower()
+        if checksum and store.CHECKSUM_PRECHECK:
+            existing = store.find_by_hash(checksum)
+            if existing is not None:
+                request.environ['fileupload.body_bytes'] = 0
+                return _accepted(dict(existing, duplicate=True))
+
+        try:
+            tmp_path, size, sha256 = spool_stream(request.stream)
+        except UploadTooLarge:
+            abort(413, message='Upload exceeds the configured size limit')
+        except EmptyUpload:
+            abort(400, message='Empty upload')
+        if checksum and checksum != sha256:
+            discard(tmp_path)
+            abort(400, message='Checksum mismatch')
+        # Chunked bodies have no Content-Length; tell the metrics what was read.
+        request.environ['fileupload.body_bytes'] = size
+
+        record, duplicate = store.ingest(tmp_path, size, sha256,
+                                         request.headers.get('X-Filename'))
+        return _accepted(dict(record, duplicate=duplicate))
+
+
+class MultipartUploadController(MethodResource, Resource):
+
+    @doc(description='Start a multi-part upload. Parts can then be sent '
+                     'concurrently and retried individually. Pass the original '
+                     'name in the X-Filename header.',
+         tags=['Upload Endpoint'])
+    def post(self):
+
+        '''
+        Post method creates a new multi-part upload
+        '''
+        upload_id = multipart.initiate(request.headers.get('X-Filename'))
+        return {'upload_id': upload_id}, 201
+
+
+class MultipartUploadStatusController(MethodResource, Resource):
+
+    @doc(description='List the parts received so far, with their offsets, '
+                     'sizes and SHA-256 checksums, so a client can resume.',
+         tags=['Upload Endpoint'])
+    def get(self, upload_id):
+
+        '''
+        Get method reports the state of a multi-part upload
+        '''
+        try:
+            return multipart.describe(upload_id)
+        except multipart.UploadNotFound:
+            abort(404, message='Unknown upload')
+
+    @doc(description='Abort a multi-part upload and discard its parts.',
+         tags=['Upload Endpoint'])
+    def delete(self, upload_id):
+
+        '''
+        Delete method aborts a multi-part upload
+        '''
+        try:
+            multipart.abort_upload(upload_id)
+        except multipart.UploadNotFound:
+            abort(404, message='Unknown upload')
+        except multipart.UploadBusy:
+            abort(409, message='Upload is being completed')
+        return '', 204
+
+
+class MultipartPartController(MethodResource, Resource):
+
+    @doc(description='Upload one numbered part as the raw request body. '
+                     'Sending the same part number again replaces it. An '
+                     'optional X-Checksum-Sha256 header is verified.',
+         tags=['Upload Endpoint'])
+    def put(self, upload_id, part_number):
+
+        '''
+        Put method streams one part of a multi-part upload to disk
+        '''
+        try:
+            part = multipart.put_part(upload_id, part_number, request.stream,
+                                      request.headers.get('X-Checksum-Sha256'))
+        except multipart.UploadNotFound:
+            abort(404, message='Unknown upload')
+        except multipart.UploadBusy:
+            abort(409, message='Upload is being completed')
+        except multipart.InvalidPart as e:
+            abort(400, message=str(e))
+        except UploadTooLarge:
+            abort(413, message='Upload exceeds the configured size limit')
+        except EmptyUpload:
+            abort(400, message='Empty part')
+        request.environ['fileupload.body_bytes'] = part['size']
+        return part
+
+
+class MultipartCompleteController(MethodResource, Resource):
+
+    @doc(description='Assemble the uploaded parts into a single document and '
+                     'queue it for processing, as for a single upload. The '
+                     'body may optionally list the expected parts as '
+                     '{"parts": [{"part_number": 1, "sha256": "..."}]}.',
+         tags=['Upload Endpoint'])
+    def post(self, upload_id):
+
+        '''
+        Post method assembles a multi-part upload into a document
+        '''
+        try:
+            result = multipart.complete(upload_id, request.get_json(silent=True))
+        except multipart.UploadNotFound:
+            abort(404, message='Unknown upload')
+        except multipart.UploadBusy:
+            abort(409, message='Upload is already being completed')
+        except multipart.InvalidPart as e:
+            abort(400, message=str(e))
+        except UploadTooLarge:
+            abort(413, message='Upload exceeds the configured size limit')
+        return _accepted(result)
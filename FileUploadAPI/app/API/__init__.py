@@ -1,19 +1,32 @@
 try:
     from flask import Flask
-    from flask_restful import Resource, Api
+    from flask_restful import Api
     from apispec import APISpec
-    from marshmallow import Schema, fields
     from apispec.ext.marshmallow import MarshmallowPlugin
-    from flask_apispec.extension import FlaskApiSpec
-    from flask_apispec.views import MethodResource
-    from flask_apispec import marshal_with, doc, use_kwargs
 
-    from API.ClusterHealth.views import HeathController
+    from API.Common.log import configure_logging
+    from API.Common.spec import CachedFlaskApiSpec
+    from API.ClusterHealth import probes
+    from API.ClusterHealth.views import (HeathController,
+                                         LivenessController,
+                                         ReadinessController)
+    from API.Upload.views import (UploadController,
+                                  MultipartUploadController,
+                                  MultipartUploadStatusController,
+                                  MultipartPartController,
+                                  MultipartCompleteController)
+    from API.Jobs.views import JobController
+    from API.Documents.views import DocumentController
+    from API.Metrics import metrics
+    from API.Metrics.views import MetricsController
 
 except Exception as e:
     print("__init Modules are Missing {}".format(e))
 
+configure_logging()
 app = Flask(__name__)  # Flask app instance initiated
+probes.init_app(app)  # Request hooks feeding the readiness probe
+metrics.init_app(app)  # Request hooks recording Prometheus metrics
 api = Api(app)  # Flask restful wraps Flask app around it.
 app.config.update({
     'APISPEC_SPEC': APISpec(
@@ -25,4 +38,4 @@ app.config.update({
     'APISPEC_SWAGGER_URL': '/swagger/',  # URI to access API Doc JSON
     'APISPEC_SWAGGER_UI_URL': '/swagger-ui/'  # URI to access UI of API Doc
 })
-docs = FlaskApiSpec(app)
+docs = CachedFlaskApiSpec(app)
@@ -1,10 +1,20 @@
-from dotenv import load_dotenv
-load_dotenv()
+from settings import load_settings
+load_settings()
 
 try:
     from API import (app,
                      api,
-                     HeathController,docs
+                     HeathController,docs,
+                     LivenessController,
+                     ReadinessController,
+                     UploadController,
+                     MultipartUploadController,
+                     MultipartUploadStatusController,
+                     MultipartPartController,
+                     MultipartCompleteController,
+                     JobController,
+                     DocumentController,
+                     MetricsController
 
                      )
 except Exception as e:
@@ -13,3 +23,37 @@ except Exception as e:
 api.add_resource(HeathController, '/health_check')
 docs.register(HeathController)
 
+api.add_resource(LivenessController, '/health/live')
+docs.register(LivenessController)
+
+api.add_resource(ReadinessController, '/health/ready')
+docs.register(ReadinessController)
+
+api.add_resource(UploadController, '/uploads')
+docs.register(UploadController)
+
+api.add_resource(MultipartUploadController, '/uploads/multipart')
+docs.register(MultipartUploadController)
+
+api.add_resource(MultipartUploadStatusController, '/uploads/multipart/<upload_id>')
+docs.register(MultipartUploadStatusController)
+
+api.add_resource(MultipartPartController,
+                 '/uploads/multipart/<upload_id>/parts/<int:part_number>')
+docs.register(MultipartPartController)
+
+api.add_resource(MultipartCompleteController, '/uploads/multipart/<upload_id>/complete')
+docs.register(MultipartCompleteController)
+
+api.add_resource(JobController, '/jobs/<job_id>')
+docs.register(JobController)
+
+api.add_resource(DocumentController, '/documents/<document_id>')
+docs.register(DocumentController)
+
+api.add_resource(MetricsController, '/metrics')
+docs.register(MetricsController)
+
+# Serialize and compress the API spec now rather than on the first request,
+# so a preloaded gunicorn master builds it once for every worker.
+docs.encoded()
@@ -0,0 +1,92 @@
+import gc
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+# gunicorn reads this file before it puts the app directory on sys.path.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from settings import load_settings  # noqa: E402
+
+load_settings()
+
+# Serving modes, selected with SERVE_MODE:
+#
+#   sync      one request per worker process (gunicorn's default)
+#   threaded  GUNICORN_THREADS requests per worker on an OS thread pool
+#   async     gevent event loop per worker, up to GUNICORN_WORKER_CONNECTIONS
+#             concurrent requests; slow clients only park a greenlet
+#
+# The same Flask app is served in every mode.
+SERVE_MODE = os.environ.get('SERVE_MODE', 'sync')
+_WORKER_CLASSES = {'sync': 'sync', 'threaded': 'gthread', 'async': 'gevent'}
+if SERVE_MODE not in _WORKER_CLASSES:
+    raise ValueError('SERVE_MODE must be one of {}'.format(', '.join(_WORKER_CLASSES)))
+
+# Workers record Prometheus metrics into per-process files in this directory
+# so /metrics can aggregate them. It has to be set before the app (and so
+# prometheus_client) is imported, which is why it lives here.
+os.makedirs(os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                  os.path.join(tempfile.gettempdir(),
+                                               'fileupload-metrics')),
+            exist_ok=True)
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8080')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', _WORKER_CLASSES[SERVE_MODE])
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# gunicorn turns a sync worker with threads > 1 into gthread, so threads only
+# apply to the threaded mode.
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Import the app once in the master and fork workers from it, so imports,
+# route registration and the serialized API spec are shared copy-on-write
+# instead of being rebuilt in every worker. Nothing in the app opens files,
+# connections or threads at import time, so this is fork-safe.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def on_starting(server):
+    # Metrics files from a previous run would be summed in as if live. Files
+    # the preloaded master opened go too; workers reopen their own after fork.
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def post_fork(server, worker):
+    # Size the worker from its actual class and settings, which
+    # GUNICORN_WORKER_CLASS may have moved away from SERVE_MODE's. This also
+    # publishes the capacity of workers that have not served a request yet.
+    from gunicorn.workers.base_async import AsyncWorker
+    from gunicorn.workers.gthread import ThreadWorker
+
+    if isinstance(worker, ThreadWorker):
+        capacity = worker.cfg.threads
+    elif isinstance(worker, AsyncWorker):
+        capacity = worker.cfg.worker_connections
+    else:
+        capacity = 1
+    os.environ['GUNICORN_WORKER_CAPACITY'] = str(capacity)
+    # Without preload_app the app is imported after this hook and reads
+    # the variable above.
+    probes = sys.modules.get('API.ClusterHealth.probes')
+    if probes is not None:
+        probes.tracker.set_capacity(capacity)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    # Move everything allocated so far out of the collector's reach, so gc
+    # passes in the workers do not touch (and un-share) the master's pages.
+    if preload_app and hasattr(gc, 'freeze'):
+        gc.freeze()
@@ -0,0 +1,15 @@
+import os
+
+from dotenv import load_dotenv
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dev.env')
+
+
+def load_settings():
+    '''
+    Load dev.env into the environment. Variables that are already set (by
+    docker-compose or the shell) win. gunicorn.conf.py, app.py and worker.py
+    all call this first, so the web tier and the job worker always agree on
+    their settings.
+    '''
+    load_dotenv(ENV_FILE)
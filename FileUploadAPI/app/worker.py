@@ -0,0 +1,118 @@
+from settings import load_settings
+load_settings()
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from API.Common.log import configure_logging
+from API.Jobs import processing, queue
+from API.Upload import multipart, spool, store
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', multiprocessing.cpu_count()))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 0.5))
+# How often abandoned multi-part uploads and spool files are looked for.
+UPLOAD_SWEEP_INTERVAL = float(os.environ.get('UPLOAD_SWEEP_INTERVAL', 300))
+
+logger = logging.getLogger('worker')
+
+
+def work(stopping, busy_since):
+    '''
+    Drain the queue until ``stopping`` is set, sleeping between polls only
+    while the queue is empty. ``busy_since`` holds the time the current job
+    was claimed (0 while idle) so the parent can spot a hung job.
+    '''
+    # Shutdown is coordinated by the parent through ``stopping`` so a job is
+    # never interrupted half way.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    processor = processing.load_processor()
+    while not stopping.is_set():
+        job = queue.claim()
+        if job is None:
+            stopping.wait(JOB_POLL_INTERVAL)
+            continue
+        busy_since.value = time.time()
+        try:
+            document = store.get(job['document_id'])
+            if document is None:
+                raise LookupError('Document {} is not stored'.format(job['document_id']))
+            result = processing.run(processor, document,
+                                    store.object_path(document['sha256']))
+        except Exception as e:
+            logger.exception('Job %s failed', job['job_id'])
+            recorded = queue.fail(job['job_id'], job['claim'],
+                                  '{}: {}'.format(type(e).__name__, e))
+        else:
+            recorded = queue.finish(job['job_id'], job['claim'], result)
+        busy_since.value = 0.0
+        if not recorded:
+            logger.warning('Job %s timed out and was requeued; its outcome '
+                           'was discarded', job['job_id'])
+
+
+def main():
+    configure_logging()
+    stopping = multiprocessing.Event()
+    signals = []
+
+    # Only record the signal here: setting a multiprocessing.Event from a
+    # handler can deadlock against a wait() in the same thread.
+    signal.signal(signal.SIGTERM, lambda signum, frame: signals.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: signals.append(signum))
+
+    def spawn(index):
+        busy_since = multiprocessing.Value('d', 0.0, lock=False)
+        process = multiprocessing.Process(target=work, args=(stopping, busy_since),
+                                          name='job-worker-{}'.format(index))
+        process.start()
+        return process, busy_since
+
+    pool = [spawn(index) for index in range(JOB_WORKERS)]
+    logger.info('Started %d job workers', len(pool))
+    last_sweep = last_upload_sweep = 0
+    while not signals:
+        if time.time() - last_sweep >= min(queue.JOB_TIMEOUT, 5):
+            last_sweep = time.time()
+            for index, (process, busy_since) in enumerate(pool):
+                started = busy_since.value
+                if (process.is_alive() and started and
+                        time.time() - started > queue.JOB_TIMEOUT):
+                    # Workers ignore SIGTERM, and a hung job would not see it
+                    # anyway. Killing the process frees its slot.
+                    logger.warning('%s overran JOB_TIMEOUT, killing it', process.name)
+                    os.kill(process.pid, signal.SIGKILL)
+                    process.join()
+                    error = 'Timed out'
+                elif not process.is_alive():
+                    error = 'Worker exited with {}'.format(process.exitcode)
+                else:
+                    continue
+                released = queue.release(queue.worker_id(process.pid), error)
+                logger.warning('%s exited with %s, restarting; %d jobs requeued',
+                               process.name, process.exitcode, released)
+                pool[index] = spawn(index)
+            # Jobs of workers on hosts that have gone away.
+            requeued = queue.requeue_stale()
+            if requeued:
+                logger.warning('Requeued %d stale jobs', requeued)
+        if time.time() - last_upload_sweep >= UPLOAD_SWEEP_INTERVAL:
+            last_upload_sweep = time.time()
+            expired = multipart.expire_stale()
+            removed = spool.expire_stale()
+            if expired or removed:
+                logger.info('Removed %d abandoned multi-part uploads and %d '
+                            'spool files', expired, removed)
+        time.sleep(0.2)
+
+    logger.info('Stopping job workers')
+    stopping.set()
+    for process, _ in pool:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+'''
+Measure how much disk I/O the content-addressed store saves on a workload
+with repeated uploads.
+
+    python bench/bench_dedup.py --uploads 500 --distinct 100 --size 262144
+
+Uploads go through POST /uploads on the Flask test client against a
+throw-away SPOOL_DIR, so the numbers include the streaming hash and the
+index lookup, but no network.
+
+Every body that is read is written to the spool first; new content is then
+renamed into the store, duplicates are deleted. bytes_spooled is therefore
+what actually hit the disk and bytes_stored what is still there. With
+--checksum the client sends X-Checksum-Sha256 and the server pre-check is
+enabled, so known content is answered before its body is spooled.
+'''
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--uploads', type=int, default=500,
+                        help='total number of uploads to send')
+    parser.add_argument('--distinct', type=int, default=100,
+                        help='number of distinct documents among them')
+    parser.add_argument('--size', type=int, default=256 * 1024,
+                        help='mean document size in bytes')
+    parser.add_argument('--checksum', action='store_true',
+                        help='send X-Checksum-Sha256 and enable the pre-check')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    spool_dir = tempfile.mkdtemp(prefix='bench-dedup-')
+    os.environ['SPOOL_DIR'] = spool_dir
+    os.environ['UPLOAD_CHECKSUM_PRECHECK'] = '1' if args.checksum else '0'
+    sys.path.insert(0, APP_DIR)
+    from app import app  # noqa: E402  (SPOOL_DIR must be set first)
+    from API.Upload import views  # noqa: E402
+    from API.Upload.store import OBJECTS_DIR  # noqa: E402
+
+    spooled = [0]
+    spool_stream = views.spool_stream
+
+    def counting_spool_stream(stream):
+        tmp_path, size, sha256 = spool_stream(stream)
+        spooled[0] += size
+        return tmp_path, size, sha256
+    views.spool_stream = counting_spool_stream
+
+    rng = random.Random(args.seed)
+    corpus = [os.urandom(max(1, int(rng.gauss(args.size, args.size / 4))))
+              for _ in range(args.distinct)]
+    # Every distinct document is sent at least once, the rest are repeats.
+    order = list(range(args.distinct)) + [rng.randrange(args.distinct)
+                                         for _ in range(args.uploads - args.distinct)]
+    rng.shuffle(order)
+    checksums = [hashlib.sha256(body).hexdigest() for body in corpus]
+
+    client = app.test_client()
+    received = duplicates = 0
+    started = time.perf_counter()
+    try:
+        for index in order:
+            body = corpus[index]
+            headers = {'X-Checksum-Sha256': checksums[index]} if args.checksum else {}
+            response = client.post('/uploads', data=body, headers=headers,
+                                   content_type='application/octet-stream')
+            assert response.status_code in (200, 202), response.get_data()
+            received += len(body)
+            duplicates += response.get_json()['duplicate']
+        elapsed = time.perf_counter() - started
+        stored = directory_bytes(OBJECTS_DIR)
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    print(json.dumps({
+        'uploads': len(order),
+        'distinct': args.distinct,
+        'duplicates': duplicates,
+        'bytes_received': received,
+        'bytes_spooled': spooled[0],
+        'bytes_stored': stored,
+        'writes_saved_ratio': round(1 - spooled[0] / received, 4),
+        'storage_saved_ratio': round(1 - stored / received, 4),
+        'seconds': round(elapsed, 3),
+        'mb_per_s': round(received / elapsed / 1e6, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
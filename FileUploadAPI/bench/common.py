@@ -0,0 +1,144 @@
+'''
+Helpers shared by the benchmark scripts: starting the app under a local
+gunicorn, HTTP client calls over loopback and reading process statistics
+from /proc.
+'''
+import http.client
+import os
+import socket
+import subprocess
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, spool_dir, **env):
+    '''
+    Start gunicorn from app/gunicorn.conf.py on 127.0.0.1:``port`` and wait
+    until the health check answers. Extra keyword arguments are passed as
+    environment variables (SERVE_MODE, GUNICORN_WORKERS, ...).
+    '''
+    environ = dict(os.environ, SPOOL_DIR=spool_dir,
+                   GUNICORN_BIND='127.0.0.1:{}'.format(port),
+                   PROMETHEUS_MULTIPROC_DIR=os.path.join(spool_dir, 'metrics'))
+    environ.update((key, str(value)) for key, value in env.items())
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+         '--config', 'gunicorn.conf.py', 'app:app'],
+        cwd=APP_DIR, env=environ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited with {}'.format(process.returncode))
+        try:
+            if request(port, 'GET', '/health_check', timeout=1)[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('gunicorn did not become ready')
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def body_chunks(size, chunk_size=64 * 1024, delay=0.0):
+    '''
+    Yield an upload body of ``size`` bytes. A random prefix keeps every
+    body distinct so deduplication never short-circuits an upload; ``delay``
+    sleeps before each chunk to mimic a slow client.
+    '''
+    prefix = os.urandom(min(32, size))
+    chunk = b'\0' * chunk_size
+    yield prefix
+    remaining = size - len(prefix)
+    while remaining > 0:
+        if delay:
+            time.sleep(delay)
+        yield chunk[:remaining]
+        remaining -= chunk_size
+
+
+def request(port, method, path, body=None, headers=None, timeout=300):
+    '''
+    Issue one request on a fresh connection and return
+    ``(status, response_bytes)``. The response body is drained, not kept.
+    '''
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        received = 0
+        while True:
+            chunk = response.read(64 * 1024)
+            if not chunk:
+                break
+            received += len(chunk)
+        return response.status, received
+    finally:
+        conn.close()
+
+
+def upload(port, size, chunk_size=64 * 1024, delay=0.0):
+    return request(port, 'POST', '/uploads',
+                   body=body_chunks(size, chunk_size, delay),
+                   headers={'Content-Type': 'application/octet-stream',
+                            'Content-Length': str(size)})[0]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def child_pids(pid):
+    '''
+    Direct children of ``pid`` (the gunicorn workers of a master), or an
+    empty list where /proc is not available.
+    '''
+    children = []
+    try:
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                with open('/proc/{}/stat'.format(entry)) as fileobj:
+                    fields = fileobj.read().rsplit(')', 1)[1].split()
+                if int(fields[1]) == pid:
+                    children.append(int(entry))
+    except OSError:
+        pass
+    return children
+
+
+def process_stats(pid):
+    '''
+    Return ``{'cpu_seconds': .., 'peak_rss_bytes': ..}`` for a live process,
+    or None if it has gone or /proc is not available.
+    '''
+    try:
+        with open('/proc/{}/stat'.format(pid)) as fileobj:
+            fields = fileobj.read().rsplit(')', 1)[1].split()
+        with open('/proc/{}/status'.format(pid)) as fileobj:
+            status = dict(line.split(':', 1) for line in fileobj if ':' in line)
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat; after the
+    # command name is split off they sit at index 11 and 12.
+    cpu = (int(fields[11]) + int(fields[12])) / float(CLOCK_TICKS)
+    peak_rss = int(status.get('VmHWM', '0 kB').split()[0]) * 1024
+    return {'cpu_seconds': cpu, 'peak_rss_bytes': peak_rss}
@@ -0,0 +1,319 @@
+'''
+Reproducible HTTP benchmark for the FileUploadAPI service.
+
+    python bench/harness.py --mix health=60,small_upload=30,large_upload=5,download=5 \\
+        --clients 16 --slow-clients 4 --duration 30 --mode sync --workers 2
+
+The app is started from app/app.py under a local gunicorn (loopback only,
+throw-away SPOOL_DIR) and driven by --clients threads, each picking the
+next operation from the weighted --mix. --slow-clients extra threads keep
+uploading --large-size bodies with --slow-delay between chunks. After a
+--warmup period the run is measured for --duration seconds.
+
+The report has requests/s and p50/p99 latency per operation, the peak RSS of
+every gunicorn worker, and server CPU seconds per byte transferred. It is
+written as JSON to --output (default bench/results/<commit>-<time>.json).
+Pass --compare with an earlier result to print the change per operation;
+the exit status is 1 if any throughput or p99 moved the wrong way by more
+than --threshold.
+'''
+import argparse
+import collections
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import (body_chunks, child_pids, free_port, percentile, process_stats,
+                    request, start_server, stop_server, upload)
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+OPERATIONS = ('health', 'ready', 'small_upload', 'large_upload', 'download',
+              'range_download')
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(
+                'unknown operation {!r}, expected one of {}'.format(name, ', '.join(OPERATIONS)))
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=BENCH_DIR, stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.measuring = False
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, operation, elapsed, ok, transferred):
+        if not self.measuring:
+            return
+        with self._lock:
+            if ok:
+                self.latencies[operation].append(elapsed)
+                self.bytes += transferred
+            else:
+                self.errors[operation] += 1
+
+
+class ServerMonitor(object):
+    '''
+    Polls /proc for the gunicorn master and its workers, keeping CPU time
+    and peak RSS for every worker seen, including ones that get replaced.
+    '''
+
+    def __init__(self, master_pid, interval=0.5):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.first = {}
+        self.last = {}
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def sample(self):
+        for pid in [self.master_pid] + child_pids(self.master_pid):
+            stats = process_stats(pid)
+            if stats is not None:
+                self.first.setdefault(pid, stats)
+                self.last[pid] = stats
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        self._thread.start()
+
+    def stop(self):
+        self.sample()
+        self._stopping.set()
+        self._thread.join()
+
+    def report(self):
+        cpu = sum(self.last[pid]['cpu_seconds'] - self.first[pid]['cpu_seconds']
+                  for pid in self.last)
+        workers = {str(pid): stats['peak_rss_bytes']
+                   for pid, stats in self.last.items() if pid != self.master_pid}
+        return {'server_cpu_seconds': round(cpu, 3),
+                'peak_rss_bytes_per_worker': workers,
+                'max_worker_peak_rss_bytes': max(workers.values()) if workers else None,
+                'master_peak_rss_bytes': self.last.get(self.master_pid, {}).get('peak_rss_bytes')}
+
+
+def run(args):
+    spool_dir = tempfile.mkdtemp(prefix='bench-')
+    port = free_port()
+    try:
+        server = start_server(port, spool_dir, SERVE_MODE=args.mode,
+                              GUNICORN_WORKERS=args.workers,
+                              GUNICORN_THREADS=args.threads,
+                              PROBE_INTERVAL=1,
+                              READY_MIN_FREE_MB=0)
+    except BaseException:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        raise
+    recorder = Recorder()
+    monitor = ServerMonitor(server.pid)
+    stopping = threading.Event()
+    rng = random.Random(args.seed)
+    names, weights = zip(*sorted(args.mix.items()))
+
+    document_path = None
+
+    def perform(operation, delay=0.0):
+        started = time.perf_counter()
+        try:
+            if operation == 'health':
+                status, transferred = request(port, 'GET', '/health_check')
+            elif operation == 'ready':
+                status, transferred = request(port, 'GET', '/health/ready')
+            elif operation in ('small_upload', 'large_upload', 'slow_upload'):
+                size = args.small_size if operation == 'small_upload' else args.large_size
+                status = upload(port, size, delay=delay)
+                transferred = size
+            elif operation == 'download':
+                status, transferred = request(port, 'GET', document_path)
+            else:
+                status, transferred = request(
+                    port, 'GET', document_path,
+                    headers={'Range': 'bytes=0-{}'.format(args.range_size - 1)})
+            ok = status < 400
+        except OSError:
+            ok, transferred = False, 0
+        recorder.record(operation, time.perf_counter() - started, ok, transferred)
+
+    def client(seed):
+        local = random.Random(seed)
+        while not stopping.is_set():
+            perform(local.choices(names, weights)[0])
+
+    def slow_client():
+        while not stopping.is_set():
+            perform('slow_upload', delay=args.slow_delay)
+
+    threads = [threading.Thread(target=client, args=(rng.random(),))
+               for _ in range(args.clients)]
+    threads += [threading.Thread(target=slow_client) for _ in range(args.slow_clients)]
+    try:
+        if {'download', 'range_download'} & set(args.mix):
+            document_path = '/documents/{}'.format(
+                upload_document(port, args.large_size))
+        for thread in threads:
+            thread.start()
+        time.sleep(args.warmup)
+        monitor.start()
+        recorder.measuring = True
+        started = time.perf_counter()
+        time.sleep(args.duration)
+        recorder.measuring = False
+        wall = time.perf_counter() - started
+        monitor.stop()
+        stopping.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        stopping.set()
+        stop_server(server)
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    operations = {}
+    for operation in sorted(set(recorder.latencies) | set(recorder.errors)):
+        latencies = recorder.latencies[operation]
+        operations[operation] = {
+            'requests': len(latencies),
+            'errors': recorder.errors[operation],
+            'requests_per_s': round(len(latencies) / wall, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        }
+    total = sum(len(values) for values in recorder.latencies.values())
+    server_stats = monitor.report()
+    cpu = server_stats['server_cpu_seconds']
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+        'environment': {'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'config': {key: value for key, value in vars(args).items()
+                   if key not in ('output', 'compare', 'threshold')},
+        'wall_seconds': round(wall, 3),
+        'requests_per_s': round(total / wall, 2),
+        'bytes_transferred': recorder.bytes,
+        'cpu_seconds_per_mb': round(cpu / (recorder.bytes / 1e6), 6) if recorder.bytes else None,
+        'operations': operations,
+        'server': server_stats,
+    }
+
+
+def upload_document(port, size):
+    '''
+    Upload one document for the download operations and return its id.
+    '''
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    try:
+        conn.request('POST', '/uploads', body=body_chunks(size),
+                     headers={'Content-Type': 'application/octet-stream',
+                              'Content-Length': str(size)})
+        response = conn.getresponse()
+        status, body = response.status, response.read()
+    finally:
+        conn.close()
+    if status not in (200, 202):
+        raise RuntimeError('uploading the download document failed with {}'.format(status))
+    return json.loads(body.decode('utf-8'))['document_id']
+
+
+def compare(current, baseline, threshold):
+    '''
+    Print per-operation changes against ``baseline`` and return True if any
+    operation regressed by more than ``threshold`` (a fraction).
+    '''
+    regressed = False
+    print('{:<16} {:>14} {:>14} {:>10}   {:>10} {:>10} {:>10}'.format(
+        'operation', 'base req/s', 'req/s', 'change', 'base p99', 'p99', 'change'))
+    for operation, now in sorted(current['operations'].items()):
+        before = baseline.get('operations', {}).get(operation)
+        if not before:
+            continue
+        rps_change = (now['requests_per_s'] / before['requests_per_s'] - 1
+                      if before['requests_per_s'] else 0.0)
+        p99_change = (now['p99_ms'] / before['p99_ms'] - 1
+                      if before['p99_ms'] and now['p99_ms'] else 0.0)
+        flag = rps_change < -threshold or p99_change > threshold
+        regressed = regressed or flag
+        print('{:<16} {:>14} {:>14} {:>+9.1%}   {:>10} {:>10} {:>+9.1%}{}'.format(
+            operation, before['requests_per_s'], now['requests_per_s'], rps_change,
+            before['p99_ms'], now['p99_ms'], p99_change, '  REGRESSION' if flag else ''))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mix', type=parse_mix,
+                        default=parse_mix('health=60,small_upload=30,large_upload=5,download=5'),
+                        help='weighted operations, e.g. health=60,small_upload=40; '
+                             'one of {}'.format(', '.join(OPERATIONS)))
+    parser.add_argument('--mode', default='sync', help='SERVE_MODE for gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--slow-clients', type=int, default=0)
+    parser.add_argument('--slow-delay', type=float, default=0.01,
+                        help='seconds between body chunks for slow clients')
+    parser.add_argument('--small-size', type=int, default=16 * 1024)
+    parser.add_argument('--large-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--range-size', type=int, default=64 * 1024)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='where to write the JSON result')
+    parser.add_argument('--compare', help='earlier JSON result to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative change treated as a regression')
+    args = parser.parse_args()
+
+    result = run(args)
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', '{}-{}.json'.format(
+            result['commit'], time.strftime('%Y%m%d-%H%M%S')))
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as fileobj:
+        json.dump(result, fileobj, indent=2, sort_keys=True)
+    print(json.dumps(result, indent=2, sort_keys=True))
+    print('Wrote {}'.format(output), file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as fileobj:
+            if compare(result, json.load(fileobj), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+'''
+Compare concurrent-upload throughput and latency between serving modes.
+
+    python bench/loadtest.py --modes sync,async --clients 32 \\
+        --size 16777216 --duration 20 --slow-delay 0.01
+
+For each mode a local gunicorn is started from app/gunicorn.conf.py on a
+loopback port with a throw-away SPOOL_DIR. Every client thread keeps
+uploading distinct bodies (so deduplication never short-circuits them)
+for --duration seconds. --slow-delay sleeps between body chunks to mimic
+slow clients, which is where the sync worker stalls. On loopback the kernel
+buffers several MB per socket, so use bodies larger than that (e.g.
+--size 16777216) or the slow sends finish before a worker ever reads them.
+'''
+import argparse
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+from common import free_port, percentile, start_server, stop_server, upload
+
+
+def run_mode(mode, args):
+    spool_dir = tempfile.mkdtemp(prefix='loadtest-')
+    port = free_port()
+    server = start_server(port, spool_dir, SERVE_MODE=mode,
+                          GUNICORN_WORKERS=args.workers)
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+
+    def client():
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                status = upload(port, args.size, args.chunk_size, args.slow_delay)
+            except OSError as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                if status in (200, 202):
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+
+    try:
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client) for _ in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+    finally:
+        stop_server(server)
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    return {'mode': mode,
+            'uploads': len(latencies),
+            'errors': len(errors),
+            'uploads_per_s': round(len(latencies) / wall, 2),
+            'mb_per_s': round(len(latencies) * args.size / wall / 1e6, 2),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modes', default='sync,async',
+                        help='comma-separated SERVE_MODE values to compare')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--size', type=int, default=1024 * 1024)
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024)
+    parser.add_argument('--slow-delay', type=float, default=0.0,
+                        help='seconds to sleep between body chunks')
+    parser.add_argument('--duration', type=float, default=20)
+    args = parser.parse_args()
+
+    results = [run_mode(mode, args) for mode in args.modes.split(',')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
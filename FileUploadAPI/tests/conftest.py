@@ -0,0 +1,31 @@
+'''
+Shared fixtures. Run from FileUploadAPI with ``python -m pytest tests``.
+
+The app reads its settings from the environment when it is imported, so a
+throw-away SPOOL_DIR is set before anything imports it.
+'''
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+SPOOL_DIR = tempfile.mkdtemp(prefix='fileupload-tests-')
+
+os.environ['SPOOL_DIR'] = SPOOL_DIR
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+sys.path.insert(0, APP_DIR)
+
+from app import app as flask_app  # noqa: E402
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(SPOOL_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    return flask_app.test_client()
+
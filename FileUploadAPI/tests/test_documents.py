@@ -0,0 +1,133 @@
+import hashlib
+import os
+
+import pytest
+from werkzeug.http import http_date
+from werkzeug.wsgi import FileWrapper
+
+BODY = os.urandom(1000)
+ETAG = hashlib.sha256(BODY).hexdigest()
+
+
+@pytest.fixture
+def document_url(client):
+    response = client.post('/uploads', data=BODY, headers={'X-Filename': 'scan.pdf'},
+                           content_type='application/octet-stream')
+    assert response.status_code in (200, 202)
+    return '/documents/{}'.format(response.get_json()['document_id'])
+
+
+def test_whole_document(client, document_url):
+    response = client.get(document_url)
+
+    assert response.status_code == 200
+    assert response.get_data() == BODY
+    assert response.headers['ETag'] == '"{}"'.format(ETAG)
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Length'] == str(len(BODY))
+    assert response.mimetype == 'application/pdf'
+
+
+def test_head_sends_headers_only(client, document_url):
+    response = client.head(document_url)
+
+    assert response.status_code == 200
+    assert response.headers['Content-Length'] == str(len(BODY))
+    assert response.get_data() == b''
+
+
+def test_unknown_document(client):
+    assert client.get('/documents/does-not-exist').status_code == 404
+
+
+@pytest.mark.parametrize('header, start, stop', [
+    ('bytes=0-0', 0, 1),
+    ('bytes=2-5', 2, 6),
+    ('bytes=990-', 990, 1000),
+    ('bytes=-3', 997, 1000),
+    ('bytes=995-5000', 995, 1000),
+])
+def test_single_range(client, document_url, header, start, stop):
+    response = client.get(document_url, headers={'Range': header})
+
+    assert response.status_code == 206
+    assert response.get_data() == BODY[start:stop]
+    assert response.headers['Content-Range'] == 'bytes {}-{}/{}'.format(
+        start, stop - 1, len(BODY))
+    assert response.headers['Content-Length'] == str(stop - start)
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=5000-6000'])
+def test_unsatisfiable_range(client, document_url, header):
+    response = client.get(document_url, headers={'Range': header})
+
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == 'bytes */{}'.format(len(BODY))
+
+
+@pytest.mark.parametrize('header', [
+    # Multiple ranges are answered with the whole document.
+    'bytes=0-1,4-5',
+    # So are unknown units and headers that do not parse.
+    'items=0-1',
+    'bytes=5-2',
+    'bytes=abc',
+])
+def test_range_falls_back_to_whole_document(client, document_url, header):
+    response = client.get(document_url, headers={'Range': header})
+
+    assert response.status_code == 200
+    assert response.get_data() == BODY
+    assert 'Content-Range' not in response.headers
+
+
+def test_if_range_with_current_etag_gets_the_range(client, document_url):
+    response = client.get(document_url, headers={'Range': 'bytes=0-9',
+                                                 'If-Range': '"{}"'.format(ETAG)})
+
+    assert response.status_code == 206
+    assert response.get_data() == BODY[:10]
+
+
+@pytest.mark.parametrize('if_range', ['"stale"', http_date(0)])
+def test_if_range_mismatch_gets_the_whole_document(client, document_url, if_range):
+    response = client.get(document_url, headers={'Range': 'bytes=0-9',
+                                                 'If-Range': if_range})
+
+    assert response.status_code == 200
+    assert response.get_data() == BODY
+
+
+@pytest.mark.parametrize('if_none_match', [
+    '"{}"'.format(ETAG),
+    'W/"{}"'.format(ETAG),
+    '"other", "{}"'.format(ETAG),
+])
+def test_if_none_match_returns_not_modified(client, document_url, if_none_match):
+    response = client.get(document_url, headers={'If-None-Match': if_none_match,
+                                                 'Range': 'bytes=0-9'})
+
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == '"{}"'.format(ETAG)
+
+
+def test_if_none_match_mismatch_sends_the_document(client, document_url):
+    response = client.get(document_url, headers={'If-None-Match': '"other"'})
+
+    assert response.status_code == 200
+    assert response.get_data() == BODY
+
+
+@pytest.mark.parametrize('server', ['gunicorn/20.0.4', 'gunicorn/20.1.0'])
+def test_range_through_file_wrapper(client, document_url, server):
+    # With wsgi.file_wrapper the file is handed over positioned at the range
+    # start and the server stops at Content-Length (the test client does
+    # not); gunicorn 20.1 ignores the position and gets the chunked reader.
+    response = client.get(document_url, headers={'Range': 'bytes=100-199'},
+                          environ_overrides={'wsgi.file_wrapper': FileWrapper,
+                                             'SERVER_SOFTWARE': server})
+
+    assert response.status_code == 206
+    assert response.headers['Content-Length'] == '100'
+    assert response.get_data()[:100] == BODY[100:200]
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+
+import pytest
+
+from API.ClusterHealth import probes
+
+
+@pytest.fixture
+def prober(monkeypatch):
+    # A prober that counts as started, so no thread replaces the snapshot
+    # the test sets up.
+    prober = probes.Prober()
+    prober._pid = os.getpid()
+    prober.snapshot = {'checked_at': time.time(), 'errors': [],
+                       'disk_free_bytes': probes.READY_MIN_FREE_BYTES,
+                       'queue_depth': 0}
+    monkeypatch.setattr(probes, 'prober', prober)
+    return prober
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = probes.RequestTracker()
+    tracker.capacity = 2
+    monkeypatch.setattr(probes, 'tracker', tracker)
+    return tracker
+
+
+def test_ready(client, prober, tracker):
+    response = client.get('/health/ready')
+
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['status'] == 'ready'
+    assert all(report['checks'].values())
+    assert report['queue_depth'] == 0
+
+
+def test_pending_probe_does_not_fail_readiness(prober, tracker):
+    prober.snapshot = None
+
+    ready, report = probes.readiness()
+
+    assert ready
+    assert report['probes'] == 'pending'
+
+
+@pytest.mark.parametrize('snapshot, check', [
+    ({'checked_at': time.time() - probes.PROBE_TTL - 1}, 'probes'),
+    ({'errors': ['queue: database is locked']}, 'probes'),
+    ({'disk_free_bytes': probes.READY_MIN_FREE_BYTES - 1}, 'disk'),
+    ({'queue_depth': probes.READY_MAX_QUEUE_DEPTH + 1}, 'queue'),
+])
+def test_probe_thresholds(client, prober, tracker, snapshot, check):
+    prober.snapshot.update(snapshot)
+
+    response = client.get('/health/ready')
+
+    assert response.status_code == 503
+    report = response.get_json()
+    assert report['status'] == 'not ready'
+    assert [name for name, ok in report['checks'].items() if not ok] == [check]
+
+
+def test_saturation_threshold(prober, tracker):
+    # readiness() discounts its own request.
+    for _ in range(tracker.capacity):
+        tracker.started()
+    assert probes.readiness()[0]
+
+    tracker.started()
+    ready, report = probes.readiness()
+
+    assert not ready
+    assert report['worker_saturation'] == 1.0
+    assert not report['checks']['saturation']
+
+
+def test_error_rate_threshold(prober, tracker):
+    tracker.started()
+    tracker.finished(200)
+    tracker.started()
+    tracker.finished(503)
+    assert tracker.error_rate() == 0.5
+    assert probes.readiness()[0]
+
+    tracker.started()
+    tracker.finished(500)
+
+    assert not probes.readiness()[0]
+
+
+def test_error_rate_only_counts_the_window(monkeypatch, tracker):
+    now = time.time()
+    monkeypatch.setattr(probes.time, 'time', lambda: now - tracker.window)
+    tracker.started()
+    tracker.finished(500)
+    monkeypatch.setattr(probes.time, 'time', lambda: now)
+    tracker.started()
+    tracker.finished(200)
+
+    assert tracker.error_rate() == 0.0
+    assert len(tracker._buckets) == 1
+
+
+def test_health_polls_do_not_count_towards_the_error_rate(client, prober, tracker):
+    prober.snapshot['queue_depth'] = probes.READY_MAX_QUEUE_DEPTH + 1
+
+    for _ in range(3):
+        assert client.get('/health/ready').status_code == 503
+
+    assert tracker.error_rate() == 0.0
+    assert tracker.in_flight == 0
+
+
+def test_first_probe_runs_on_the_thread(monkeypatch):
+    release = threading.Event()
+    prober = probes.Prober(interval=3600)
+
+    def probe():
+        release.wait(5)
+        return {'checked_at': time.time(), 'errors': []}
+    monkeypatch.setattr(prober, 'probe', probe)
+
+    prober.ensure_started()
+
+    assert prober.snapshot is None
+    release.set()
+    for _ in range(100):
+        if prober.snapshot is not None:
+            break
+        time.sleep(0.01)
+    assert prober.snapshot is not None
@@ -0,0 +1,136 @@
+import pytest
+
+from API.Common.db import LocalConnection
+from API.Jobs import queue
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(monkeypatch, tmp_path):
+    # Uploads in other tests enqueue jobs too; give each test its own queue.
+    monkeypatch.setattr(queue, 'connection', LocalConnection(
+        str(tmp_path / 'jobs.sqlite3'), queue._SCHEMA))
+
+
+def test_enqueue_is_idempotent_per_document():
+    job = queue.enqueue('doc-1')
+
+    assert job['status'] == queue.QUEUED
+    assert job['attempts'] == 0
+    assert queue.enqueue('doc-1')['job_id'] == job['job_id']
+    assert queue.depth() == 1
+
+
+def test_claim_takes_the_oldest_queued_job():
+    first = queue.enqueue('doc-1')
+    queue.enqueue('doc-2')
+
+    job = queue.claim()
+
+    assert job['job_id'] == first['job_id']
+    assert job['status'] == queue.RUNNING
+    assert job['attempts'] == 1
+    assert job['claim']
+    assert queue.claim()['document_id'] == 'doc-2'
+    assert queue.claim() is None
+
+
+def test_finish_records_the_result():
+    queue.enqueue('doc-1')
+    job = queue.claim()
+
+    assert queue.finish(job['job_id'], job['claim'], {'pages': 3})
+
+    done = queue.get(job['job_id'])
+    assert done['status'] == queue.DONE
+    assert done['result'] == {'pages': 3}
+    assert done['error'] is None
+    # The claim is spent once the outcome is recorded.
+    assert not queue.finish(job['job_id'], job['claim'], {'pages': 4})
+
+
+def test_finish_with_a_wrong_claim_is_rejected():
+    queue.enqueue('doc-1')
+    job = queue.claim()
+
+    assert not queue.finish(job['job_id'], 'not-the-claim', {})
+    assert queue.get(job['job_id'])['status'] == queue.RUNNING
+
+
+def test_failed_job_is_retried_until_max_attempts():
+    job_id = queue.enqueue('doc-1')['job_id']
+
+    for attempt in range(1, queue.MAX_ATTEMPTS + 1):
+        job = queue.claim()
+        assert job['job_id'] == job_id
+        assert job['attempts'] == attempt
+        assert queue.fail(job_id, job['claim'], 'boom {}'.format(attempt))
+
+    failed = queue.get(job_id)
+    assert failed['status'] == queue.FAILED
+    assert failed['error'] == 'boom {}'.format(queue.MAX_ATTEMPTS)
+    assert queue.claim() is None
+
+
+def test_release_requeues_only_the_workers_jobs():
+    queue.enqueue('doc-1')
+    queue.enqueue('doc-2')
+    mine = queue.claim()
+    other = queue.claim()
+    queue.connection().execute('UPDATE jobs SET worker = ? WHERE job_id = ?',
+                               ('elsewhere:1', other['job_id']))
+
+    assert queue.release(queue.worker_id(), 'Worker killed') == 1
+
+    released = queue.get(mine['job_id'])
+    assert released['status'] == queue.QUEUED
+    assert released['error'] == 'Worker killed'
+    assert queue.get(other['job_id'])['status'] == queue.RUNNING
+    # The killed worker's claim is void.
+    assert not queue.finish(mine['job_id'], mine['claim'], {})
+
+
+def test_requeue_stale_voids_the_old_claim():
+    queue.enqueue('doc-1')
+    stale = queue.claim()
+
+    assert queue.requeue_stale(timeout=3600) == 0
+    assert queue.requeue_stale(timeout=-1) == 1
+
+    assert queue.get(stale['job_id'])['status'] == queue.QUEUED
+    retry = queue.claim()
+    assert retry['attempts'] == 2
+    # The overrunning worker finishes late; only the retry's outcome counts.
+    assert not queue.finish(stale['job_id'], stale['claim'], {'from': 'stale'})
+    assert not queue.fail(stale['job_id'], stale['claim'], 'late failure')
+    assert queue.finish(retry['job_id'], retry['claim'], {'from': 'retry'})
+    assert queue.get(stale['job_id'])['result'] == {'from': 'retry'}
+
+
+def test_requeue_stale_fails_jobs_out_of_attempts():
+    job_id = queue.enqueue('doc-1')['job_id']
+    for _ in range(queue.MAX_ATTEMPTS):
+        queue.claim()
+        queue.requeue_stale(timeout=-1)
+
+    job = queue.get(job_id)
+    assert job['status'] == queue.FAILED
+    assert job['error'] == 'Timed out'
+
+
+def test_job_endpoint(client):
+    job = queue.enqueue('doc-1')
+
+    response = client.get('/jobs/{}'.format(job['job_id']))
+
+    assert response.status_code == 200
+    assert set(response.get_json()) == {'job_id', 'document_id', 'status', 'attempts',
+                                        'result', 'error', 'created', 'started',
+                                        'finished'}
+    assert response.get_json()['status'] == queue.QUEUED
+
+
+def test_unknown_job(client):
+    response = client.get('/jobs/does-not-exist')
+
+    assert response.status_code == 404
+    assert response.get_json()['message'] == 'Unknown job'
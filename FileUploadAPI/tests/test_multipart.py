@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from API.Upload import multipart, spool, store
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def initiate(client, filename='scan.pdf'):
+    response = client.post('/uploads/multipart', headers={'X-Filename': filename})
+    assert response.status_code == 201
+    return response.get_json()['upload_id']
+
+
+def put_part(client, upload_id, part_number, data, **headers):
+    return client.put('/uploads/multipart/{}/parts/{}'.format(upload_id, part_number),
+                      data=data, headers=headers,
+                      content_type='application/octet-stream')
+
+
+def complete(client, upload_id, body=None):
+    if body is None:
+        return client.post('/uploads/multipart/{}/complete'.format(upload_id))
+    return client.post('/uploads/multipart/{}/complete'.format(upload_id),
+                       data=json.dumps(body), content_type='application/json')
+
+
+def write_lock(upload_id, **lock):
+    lock = dict({'token': 'other', 'pid': os.getpid(),
+                 'host': socket.gethostname(), 'started': time.time()}, **lock)
+    with open(os.path.join(multipart.upload_dir(upload_id), '.completing'), 'w') as fileobj:
+        json.dump(lock, fileobj)
+
+
+def test_parts_are_assembled_in_part_number_order(client):
+    upload_id = initiate(client)
+    assert put_part(client, upload_id, 2, b'world').status_code == 200
+    assert put_part(client, upload_id, 1, b'hello ').status_code == 200
+
+    response = complete(client, upload_id)
+
+    assert response.status_code == 202
+    document = response.get_json()
+    assert document['size'] == 11
+    assert document['parts'] == 2
+    assert document['sha256'] == sha256(b'hello world')
+    with open(store.object_path(document['sha256']), 'rb') as fileobj:
+        assert fileobj.read() == b'hello world'
+    assert client.get('/uploads/multipart/{}'.format(upload_id)).status_code == 404
+
+
+def test_status_lists_parts_with_offsets(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'abc')
+    put_part(client, upload_id, 2, b'defgh')
+
+    upload = client.get('/uploads/multipart/{}'.format(upload_id)).get_json()
+
+    assert upload['filename'] == 'scan.pdf'
+    assert upload['parts'] == [
+        {'part_number': 1, 'size': 3, 'sha256': sha256(b'abc'), 'offset': 0},
+        {'part_number': 2, 'size': 5, 'sha256': sha256(b'defgh'), 'offset': 3},
+    ]
+
+
+def test_resending_a_part_replaces_it(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'first attempt')
+    put_part(client, upload_id, 1, b'retry')
+
+    document = complete(client, upload_id).get_json()
+
+    assert document['sha256'] == sha256(b'retry')
+    assert document['size'] == 5
+
+
+def test_replaced_part_body_is_removed(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'first attempt')
+    put_part(client, upload_id, 1, b'retry')
+
+    bodies = [name for name in os.listdir(multipart.upload_dir(upload_id))
+              if name.endswith('.part')]
+    assert len(bodies) == 1
+
+
+@pytest.mark.parametrize('numbers', [[2], [1, 3], [2, 3]])
+def test_parts_must_be_contiguous_from_one(client, numbers):
+    upload_id = initiate(client)
+    for number in numbers:
+        put_part(client, upload_id, number, b'x')
+
+    response = complete(client, upload_id)
+
+    assert response.status_code == 400
+    assert 'contiguously' in response.get_json()['message']
+
+
+def test_complete_without_parts_is_rejected(client):
+    upload_id = initiate(client)
+    assert complete(client, upload_id).status_code == 400
+
+
+@pytest.mark.parametrize('part_number', [0, multipart.MAX_PARTS + 1])
+def test_part_number_out_of_range_is_rejected(client, part_number):
+    upload_id = initiate(client)
+    assert put_part(client, upload_id, part_number, b'x').status_code == 400
+
+
+def test_empty_part_is_rejected(client):
+    upload_id = initiate(client)
+    assert put_part(client, upload_id, 1, b'').status_code == 400
+
+
+def test_part_checksum_header_is_verified(client):
+    upload_id = initiate(client)
+
+    bad = put_part(client, upload_id, 1, b'data', **{'X-Checksum-Sha256': sha256(b'other')})
+    good = put_part(client, upload_id, 1, b'data',
+                    **{'X-Checksum-Sha256': sha256(b'data').upper()})
+
+    assert bad.status_code == 400
+    assert good.status_code == 200
+
+
+def test_complete_verifies_expected_checksums(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'one')
+    put_part(client, upload_id, 2, b'two')
+
+    mismatch = complete(client, upload_id, {'parts': [
+        {'part_number': 1, 'sha256': sha256(b'one')},
+        {'part_number': 2, 'sha256': sha256(b'three')}]})
+    assert mismatch.status_code == 400
+    assert 'part 2' in mismatch.get_json()['message']
+
+    # A rejected completion releases the lock, so the upload can be fixed.
+    assert put_part(client, upload_id, 2, b'three').status_code == 200
+    response = complete(client, upload_id, {'parts': [
+        {'part_number': 1, 'sha256': sha256(b'one')},
+        {'part_number': 2, 'sha256': sha256(b'three')}]})
+    assert response.status_code == 202
+
+
+def test_complete_rejects_a_different_part_list(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'one')
+
+    response = complete(client, upload_id, {'parts': [{'part_number': 1},
+                                                      {'part_number': 2}]})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [
+    [1, 2],
+    'parts',
+    {'parts': 'abc'},
+    {'parts': {'part_number': 1}},
+    {'parts': [1]},
+    {'parts': [{}]},
+    {'parts': [{'part_number': 'x'}]},
+    {'parts': [{'part_number': 1.0}]},
+    {'parts': [{'part_number': True}]},
+    {'parts': [{'part_number': 1, 'sha256': 5}]},
+    {'parts': [{'part_number': 1}, {'part_number': 1}]},
+])
+def test_malformed_complete_body_is_rejected(client, body):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, os.urandom(16))
+
+    response = complete(client, upload_id, body)
+
+    assert response.status_code == 400
+    # The upload is left intact and can still be completed.
+    assert complete(client, upload_id).status_code == 202
+
+
+def test_total_size_is_limited(client, monkeypatch):
+    monkeypatch.setattr(multipart, 'MAX_UPLOAD_BYTES', 10)
+    upload_id = initiate(client)
+
+    assert put_part(client, upload_id, 1, b'x' * 6).status_code == 200
+    assert put_part(client, upload_id, 2, b'x' * 6).status_code == 413
+    assert put_part(client, upload_id, 2, b'x' * 4).status_code == 200
+    # Replacing a part only counts the new copy.
+    assert put_part(client, upload_id, 1, b'x' * 6).status_code == 200
+
+    monkeypatch.setattr(multipart, 'MAX_UPLOAD_BYTES', 8)
+    assert complete(client, upload_id).status_code == 413
+
+
+def test_unknown_upload(client):
+    assert client.get('/uploads/multipart/not-an-id').status_code == 404
+    assert put_part(client, 'a' * 32, 1, b'x').status_code == 404
+    assert complete(client, 'a' * 32).status_code == 404
+    assert complete(client, 'a' * 32, [1]).status_code == 404
+    assert client.delete('/uploads/multipart/{}'.format('a' * 32)).status_code == 404
+
+
+def test_abort_discards_the_upload(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'x')
+
+    assert client.delete('/uploads/multipart/{}'.format(upload_id)).status_code == 204
+    assert client.get('/uploads/multipart/{}'.format(upload_id)).status_code == 404
+
+
+def test_live_completion_lock_blocks_changes(client):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'x')
+    write_lock(upload_id)
+
+    assert put_part(client, upload_id, 1, b'y').status_code == 409
+    assert complete(client, upload_id).status_code == 409
+    assert client.delete('/uploads/multipart/{}'.format(upload_id)).status_code == 409
+
+
+@pytest.mark.parametrize('lock', [
+    # Owner process on this host is gone.
+    {'pid': 2 ** 22 + 1},
+    # Owner on another host, but older than the completion timeout.
+    {'host': 'elsewhere', 'started': time.time() - multipart.COMPLETE_TIMEOUT - 1},
+])
+def test_stale_completion_lock_is_taken_over(client, lock):
+    upload_id = initiate(client)
+    put_part(client, upload_id, 1, b'x')
+    write_lock(upload_id, **lock)
+
+    assert put_part(client, upload_id, 1, os.urandom(16)).status_code == 200
+    assert complete(client, upload_id).status_code == 202
+
+
+def test_expire_stale_removes_idle_uploads_and_spool_files(client):
+    idle = initiate(client)
+    put_part(client, idle, 1, b'x')
+    spool.ensure_dirs()
+    leftover = os.path.join(spool.INCOMING_DIR, 'leftover')
+    open(leftover, 'w').close()
+
+    assert multipart.expire_stale(ttl=3600) == 0
+    assert os.path.isdir(multipart.upload_dir(idle))
+
+    assert multipart.expire_stale(ttl=-1) >= 1
+    assert spool.expire_stale(ttl=-1) >= 1
+    assert not os.path.exists(multipart.upload_dir(idle))
+    assert not os.path.exists(leftover)
@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from API.Upload import spool, store, views
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def upload(client, data, **headers):
+    return client.post('/uploads', data=data, headers=headers,
+                       content_type='application/octet-stream')
+
+
+def copies_in_store(body):
+    copies = 0
+    for root, _, files in os.walk(store.OBJECTS_DIR):
+        for name in files:
+            with open(os.path.join(root, name), 'rb') as fileobj:
+                copies += fileobj.read() == body
+    return copies
+
+
+def incoming():
+    spool.ensure_dirs()
+    return set(os.listdir(spool.INCOMING_DIR))
+
+
+def test_upload_is_stored_and_queued(client):
+    body = os.urandom(1000)
+
+    response = upload(client, body, **{'X-Filename': 'scan.pdf'})
+
+    assert response.status_code == 202
+    document = response.get_json()
+    assert document['size'] == 1000
+    assert document['sha256'] == sha256(body)
+    assert document['filename'] == 'scan.pdf'
+    assert document['duplicate'] is False
+    assert document['job_status'] == 'queued'
+    assert response.headers['Location'].endswith('/jobs/{}'.format(document['job_id']))
+    with open(store.object_path(document['sha256']), 'rb') as fileobj:
+        assert fileobj.read() == body
+
+
+def test_form_upload_is_rejected(client):
+    response = client.post('/uploads', data={'file': (io.BytesIO(b'x'), 'scan.pdf')},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 415
+
+
+def test_empty_upload_is_rejected(client):
+    before = incoming()
+
+    assert upload(client, b'').status_code == 400
+    assert incoming() == before
+
+
+def test_upload_size_is_limited(client, monkeypatch):
+    monkeypatch.setattr(spool, 'MAX_UPLOAD_BYTES', 10)
+    before = incoming()
+
+    assert upload(client, os.urandom(11)).status_code == 413
+    assert incoming() == before
+    assert upload(client, os.urandom(10)).status_code == 202
+
+
+def test_duplicate_returns_the_existing_document_and_job(client):
+    body = os.urandom(1000)
+
+    first = upload(client, body, **{'X-Filename': 'first.pdf'})
+    again = upload(client, body, **{'X-Filename': 'second.pdf'})
+
+    assert first.status_code == 202
+    assert again.status_code == 200
+    original, duplicate = first.get_json(), again.get_json()
+    assert duplicate['duplicate'] is True
+    assert duplicate['document_id'] == original['document_id']
+    assert duplicate['job_id'] == original['job_id']
+    assert duplicate['filename'] == 'first.pdf'
+    assert copies_in_store(body) == 1
+
+
+def test_checksum_header_is_verified(client):
+    body = os.urandom(1000)
+    before = incoming()
+
+    bad = upload(client, body, **{'X-Checksum-Sha256': sha256(b'other')})
+    good = upload(client, body, **{'X-Checksum-Sha256': sha256(body).upper()})
+
+    assert bad.status_code == 400
+    assert incoming() == before
+    assert good.status_code == 202
+
+
+def test_checksum_precheck_skips_the_body(client, monkeypatch):
+    body = os.urandom(1000)
+    original = upload(client, body).get_json()
+    monkeypatch.setattr(store, 'CHECKSUM_PRECHECK', True)
+
+    def spool_stream(stream):
+        raise AssertionError('body was read')
+    monkeypatch.setattr(views, 'spool_stream', spool_stream)
+
+    response = upload(client, body, **{'X-Checksum-Sha256': sha256(body)})
+
+    assert response.status_code == 200
+    assert response.get_json()['document_id'] == original['document_id']
+    assert response.get_json()['job_id'] == original['job_id']
+
+
+def test_checksum_precheck_is_off_by_default(client, monkeypatch):
+    body = os.urandom(1000)
+    upload(client, body)
+    spooled = []
+    monkeypatch.setattr(views, 'spool_stream',
+                        lambda stream: spooled.append(1) or spool.spool_stream(stream))
+
+    response = upload(client, body, **{'X-Checksum-Sha256': sha256(body)})
+
+    assert response.status_code == 200
+    assert spooled == [1]
+
+
+def test_ingest_race_returns_the_winners_document(client, monkeypatch):
+    body = os.urandom(1000)
+    winner = upload(client, body).get_json()
+    # Another writer inserts between this writer's lookup and its insert.
+    lookups = []
+    find_by_hash = store.find_by_hash
+
+    def racing_find_by_hash(sha):
+        lookups.append(sha)
+        return None if len(lookups) == 1 else find_by_hash(sha)
+    monkeypatch.setattr(store, 'find_by_hash', racing_find_by_hash)
+    spool.ensure_dirs()
+    fd, tmp_path = tempfile.mkstemp(dir=spool.INCOMING_DIR)
+    with os.fdopen(fd, 'wb') as fileobj:
+        fileobj.write(body)
+
+    record, duplicate = store.ingest(tmp_path, len(body), sha256(body), 'loser.pdf')
+
+    assert duplicate is True
+    assert record['document_id'] == winner['document_id']
+    assert record['filename'] is None
+    assert not os.path.exists(tmp_path)
+    assert copies_in_store(body) == 1